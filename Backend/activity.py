@@ -0,0 +1,91 @@
+# Abaixo temos o feed de atividades recentes (novos clientes e vendas) usado pelo
+# overviewSection e pelo message. Ele sai de uma única consulta UNION ALL, já ordenada por
+# (created_at, tipo, id) decrescente, e é paginado por cursor (keyset): a próxima página
+# começa logo depois da última linha da anterior. Cada ramo lê só `limit` linhas de trás para
+# frente pelos índices em created_at, então a página 1000 custa o mesmo que a primeira.
+
+import base64
+from datetime import datetime
+from fastapi import HTTPException
+from sqlalchemy import DECIMAL, String, and_, cast, literal, null, or_, select, union_all
+from models import Customer, Sale
+
+# os tipos também fazem parte da ordenação; em um mesmo instante, 'sale' vem antes de 'customer'
+# cada ramo preenche o nome (clientes) ou o valor (vendas) e deixa a outra coluna nula
+SOURCES = {
+    "customer": (Customer, Customer.customer_name, cast(null(), DECIMAL(10, 2))),
+    "sale": (Sale, cast(null(), String(100)), Sale.total_amount),
+}
+
+
+def encode_cursor(row):
+    raw = f"{row.created_at.isoformat()}|{row.type}|{row.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, kind, id = raw.split("|")
+        if kind not in SOURCES:
+            raise ValueError(kind)
+        return datetime.fromisoformat(created_at), kind, int(id)
+    except ValueError:
+        raise HTTPException(status_code=422, detail="Cursor inválido")
+
+
+def after_cursor(model, kind, cursor):
+    # equivalente a (created_at, tipo, id) < cursor, escrito de forma que created_at <= x
+    # seja a condição do índice; o tipo do ramo é constante, então a comparação é resolvida aqui
+    created_at, cursor_kind, cursor_id = cursor
+    if kind > cursor_kind:
+        return model.created_at < created_at
+    if kind < cursor_kind:
+        return model.created_at <= created_at
+    return and_(model.created_at <= created_at, or_(model.created_at < created_at, model.id < cursor_id))
+
+
+async def activity_feed(db, limit, period=None, cursor=None):
+    """Retorna (linhas, próximo cursor ou None) do feed, já ordenado"""
+    position = decode_cursor(cursor) if cursor else None
+
+    branches = []
+    for kind, (model, name, amount) in SOURCES.items():
+        branch = select(
+            literal(kind).label("type"),
+            model.id,
+            name.label("name"),
+            amount.label("amount"),
+            model.created_at,
+        ).filter(model.created_at.isnot(None))
+        if period:
+            branch = period.apply(branch, model.created_at)
+        if position:
+            branch = branch.filter(after_cursor(model, kind, position))
+        branches.append(branch.order_by(model.created_at.desc(), model.id.desc()).limit(limit))
+
+    feed = union_all(*branches).subquery()
+    query = (
+        select(feed)
+        .order_by(feed.c.created_at.desc(), feed.c.type.desc(), feed.c.id.desc())
+        .limit(limit)
+    )
+    rows = (await db.execute(query)).all()
+
+    next_cursor = encode_cursor(rows[-1]) if rows and len(rows) == limit else None
+    return rows, next_cursor
+
+
+def describe(row):
+    # formato que o front espera para cada atividade
+    if row.type == "customer":
+        desc = f"Novo cliente: {row.name}"
+    else:
+        desc = f"Venda de R$ {row.amount:.2f} realizada"
+    return {
+        "type": row.type,
+        "id": row.id,
+        "desc": desc,
+        "time": row.created_at.strftime("%H:%M"),
+        "created_at": row.created_at,
+    }
@@ -0,0 +1,50 @@
+-- Live activity for /overviewSection/stream. After every statement that
+-- inserts sales or customers, one NOTIFY activity carries the statement's row
+-- count and its newest rows as JSON. The API listens on a single connection
+-- and fans the events out to its subscribers, so subscribers cost no queries.
+--
+-- NOTIFY payloads are limited to 8000 bytes, and a bulk load inserts
+-- thousands of rows per statement, so only the newest ACTIVITY_ROWS (20) of
+-- each statement are sent; the feed never shows more than that at once.
+-- Safe to run again: the API applies this file at startup.
+
+SELECT pg_advisory_xact_lock(hashtext('activity.sql'));
+
+CREATE OR REPLACE FUNCTION sales_activity_notify() RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM pg_notify('activity', json_build_object(
+        'type', 'sale',
+        'count', (SELECT COUNT(*) FROM new_sales),
+        'rows', (
+            SELECT COALESCE(json_agg(json_build_object('id', id, 'amount', total_amount, 'created_at', created_at)), '[]')
+            FROM (SELECT id, total_amount, created_at FROM new_sales ORDER BY created_at DESC, id DESC LIMIT 20) newest
+        )
+    )::text)
+    FROM (SELECT 1 FROM new_sales LIMIT 1) any_rows;
+    RETURN NULL;
+END $$;
+
+CREATE OR REPLACE FUNCTION customers_activity_notify() RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM pg_notify('activity', json_build_object(
+        'type', 'customer',
+        'count', (SELECT COUNT(*) FROM new_customers),
+        'rows', (
+            SELECT COALESCE(json_agg(json_build_object('id', id, 'name', left(customer_name, 100), 'created_at', created_at)), '[]')
+            FROM (
+                SELECT id, customer_name, created_at FROM new_customers
+                WHERE created_at IS NOT NULL
+                ORDER BY created_at DESC, id DESC LIMIT 20
+            ) newest
+        )
+    )::text)
+    FROM (SELECT 1 FROM new_customers LIMIT 1) any_rows;
+    RETURN NULL;
+END $$;
+
+CREATE OR REPLACE TRIGGER sales_activity AFTER INSERT ON sales
+    REFERENCING NEW TABLE AS new_sales
+    FOR EACH STATEMENT EXECUTE FUNCTION sales_activity_notify();
+CREATE OR REPLACE TRIGGER customers_activity AFTER INSERT ON customers
+    REFERENCING NEW TABLE AS new_customers
+    FOR EACH STATEMENT EXECUTE FUNCTION customers_activity_notify();
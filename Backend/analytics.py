@@ -0,0 +1,170 @@
+# Abaixo temos o compilador das consultas do /query. Uma pergunta é descrita por dimensões
+# (como agrupar), medidas (o que calcular) e filtros, e vira um único SELECT ... GROUP BY
+# sobre os modelos do models.py, com os joins estritamente necessários.
+#
+# Os valores dos filtros entram como parâmetros (listas como IN expansível), então duas
+# perguntas com o mesmo "formato" (mesmas dimensões, medidas, tipos de filtro e ordenação)
+# reaproveitam o mesmo statement compilado, guardado em um LRU por formato; o SQLAlchemy e o
+# asyncpg então também reaproveitam o SQL e o prepared statement.
+#
+# O statement roda no snapshot colunar (snapshot.py) quando ele é recente o bastante, ou no
+# Postgres (ver run).
+
+from functools import lru_cache
+import duckdb
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import DECIMAL, Date, Integer, and_, bindparam, cast, func, or_, select
+from models import Category, Channel, Product, ProductSale, Sale, Store
+from snapshot import snapshot
+
+# dimensão -> (colunas de saída, joins necessários)
+DIMENSIONS = {
+    "store": (lambda: [Store.id.label("store_id"), Store.name.label("store")], ("stores",)),
+    "channel": (lambda: [Channel.id.label("channel_id"), Channel.name.label("channel")], ("channels",)),
+    "product": (lambda: [Product.id.label("product_id"), Product.name.label("product")], ("products",)),
+    "category": (lambda: [Category.id.label("category_id"), Category.name.label("category")], ("categories",)),
+    "weekday": (lambda: [func.extract("dow", Sale.created_at).cast(Integer).label("weekday")], ()),
+    "hour": (lambda: [func.extract("hour", Sale.created_at).cast(Integer).label("hour")], ()),
+    "day": (lambda: [cast(Sale.created_at, Date).label("day")], ()),
+    "status": (lambda: [Sale.sale_status_desc.label("status")], ()),
+}
+
+MEASURES = ("revenue", "orders", "ticket", "quantity", "delivery_p50", "delivery_p90", "delivery_p95")
+
+# medida -> joins necessários; a quantidade é a dos itens vendidos
+MEASURE_JOINS = {"quantity": ("product_sales",)}
+
+# filtro -> joins necessários; os valores chegam como parâmetros na execução
+FILTERS = {
+    "store_id": (),
+    "channel_id": (),
+    "channel": ("channels",),
+    "status": (),
+    "weekday": (),
+    "product_id": ("product_sales",),
+    "category_id": ("products",),
+    "start": (),
+    "end": (),
+    "hours": (),
+    "hours_overnight": (),  # hour_from > hour_to, ex.: 22h às 2h
+}
+
+# cada join e o que ele exige antes; product_sales muda o grão da consulta para itens vendidos
+JOINS = {
+    "stores": ((), lambda query: query.join(Store, Store.id == Sale.store_id)),
+    "channels": ((), lambda query: query.join(Channel, Channel.id == Sale.channel_id)),
+    "product_sales": ((), lambda query: query.join(ProductSale, ProductSale.sale_id == Sale.id)),
+    "products": (("product_sales",), lambda query: query.join(Product, Product.id == ProductSale.product_id)),
+    "categories": (("products",), lambda query: query.join(Category, Category.id == Product.category_id)),
+}
+
+
+def required_joins(names):
+    # fecha as dependências e devolve os joins na ordem em que precisam ser aplicados
+    ordered = []
+
+    def visit(name):
+        for dependency in JOINS[name][0]:
+            visit(dependency)
+        if name not in ordered:
+            ordered.append(name)
+
+    for name in names:
+        visit(name)
+    return ordered
+
+
+def measure_columns(measures, product_grain):
+    # no grão de itens (produto/categoria), receita é a dos itens e pedidos são vendas distintas
+    revenue = func.sum(ProductSale.total_price) if product_grain else func.sum(Sale.total_amount)
+    orders = func.count(func.distinct(Sale.id)) if product_grain else func.count()
+    columns = {
+        "revenue": func.round(cast(revenue, DECIMAL(14, 2)), 2),
+        "orders": orders,
+        "ticket": func.round(cast(revenue, DECIMAL(14, 2)) / func.nullif(orders, 0), 2),
+        "quantity": func.sum(ProductSale.quantity),
+        "delivery_p50": func.percentile_cont(0.5).within_group(Sale.delivery_seconds),
+        "delivery_p90": func.percentile_cont(0.9).within_group(Sale.delivery_seconds),
+        "delivery_p95": func.percentile_cont(0.95).within_group(Sale.delivery_seconds),
+    }
+    return [columns[name].label(name) for name in measures]
+
+
+def filter_clause(name):
+    hour = func.extract("hour", Sale.created_at)
+    return {
+        "store_id": Sale.store_id.in_(bindparam("store_id", expanding=True)),
+        "channel_id": Sale.channel_id.in_(bindparam("channel_id", expanding=True)),
+        "channel": Channel.name.in_(bindparam("channel", expanding=True)),
+        "status": Sale.sale_status_desc.in_(bindparam("status", expanding=True)),
+        "weekday": func.extract("dow", Sale.created_at).in_(bindparam("weekday", expanding=True)),
+        "product_id": ProductSale.product_id.in_(bindparam("product_id", expanding=True)),
+        "category_id": Product.category_id.in_(bindparam("category_id", expanding=True)),
+        # intervalo semiaberto sobre created_at, como em filters.py: usa idx_sales_created_at
+        "start": Sale.created_at >= bindparam("start"),
+        "end": Sale.created_at < bindparam("end"),
+        "hours": and_(hour >= bindparam("hour_from", type_=Integer), hour <= bindparam("hour_to", type_=Integer)),
+        "hours_overnight": or_(hour >= bindparam("hour_from", type_=Integer), hour <= bindparam("hour_to", type_=Integer)),
+    }[name]
+
+
+def filter_params(period=None, hour_from=None, hour_to=None, **values):
+    """Devolve (filtros em ordem canônica, parâmetros) a partir dos valores informados"""
+    params = {}
+    filters = []
+    for name, value in values.items():
+        if value:
+            filters.append(name)
+            params[name] = value
+    if period and period.start:
+        filters.append("start")
+        params["start"] = period.start
+    if period and period.end:
+        filters.append("end")
+        params["end"] = period.end
+    if hour_from is not None or hour_to is not None:
+        params["hour_from"] = 0 if hour_from is None else hour_from
+        params["hour_to"] = 23 if hour_to is None else hour_to
+        filters.append("hours_overnight" if params["hour_from"] > params["hour_to"] else "hours")
+    return tuple(sorted(filters)), params
+
+
+@lru_cache(maxsize=256)
+def compile_query(dimensions, measures, filters, order_by, descending):
+    """Monta o SELECT de um formato de consulta; os valores entram como parâmetros"""
+    joins = [join for name in dimensions for join in DIMENSIONS[name][1]]
+    joins += [join for name in filters for join in FILTERS[name]]
+    joins += [join for name in measures for join in MEASURE_JOINS.get(name, ())]
+    joins = required_joins(joins)
+    product_grain = "product_sales" in joins
+
+    group_columns = [column for name in dimensions for column in DIMENSIONS[name][0]()]
+    query = select(*group_columns, *measure_columns(measures, product_grain)).select_from(Sale)
+    for name in joins:
+        query = JOINS[name][1](query)
+    for name in filters:
+        query = query.where(filter_clause(name))
+    if group_columns:
+        query = query.group_by(*group_columns)
+
+    order = query.selected_columns[order_by]
+    query = query.order_by(order.desc().nulls_last() if descending else order.asc().nulls_last())
+    return query.limit(bindparam("limit", type_=Integer))
+
+
+async def run(db, statement, params, response, max_staleness):
+    """Executa no snapshot, se ele tiver no máximo max_staleness segundos, ou no Postgres"""
+    # o DuckDB não é assíncrono: a consulta roda no threadpool para não travar a event loop
+    if max_staleness > 0 and snapshot.fresh(max_staleness):
+        try:
+            rows = await run_in_threadpool(snapshot.execute, statement, params)
+            response.headers["X-Data-Source"] = "snapshot"
+            response.headers["X-Snapshot-Age"] = f"{snapshot.age():.0f}"
+            return rows
+        except duckdb.Error as error:
+            print(f"consulta no snapshot falhou, usando o Postgres: {error}", flush=True)
+    snapshot.fallbacks += 1
+
+    result = await db.execute(statement, params)
+    response.headers["X-Data-Source"] = "postgres"
+    return [dict(row) for row in result.mappings()]
@@ -0,0 +1,214 @@
+# Abaixo temos o detector de anomalias nas séries diárias de pedidos e receita (vendas
+# concluídas): o total, cada canal e cada loja. Cada série guarda um estado pequeno em
+# anomaly_state: a média e a variância móveis exponenciais (EWMA) de cada dia da semana, que
+# formam a linha de base sazonal, e o nível, uma EWMA da razão entre o valor do dia e a linha
+# de base.
+#
+# Uma thread da API processa cada dia assim que ele fecha (quando já há vendas no dia seguinte),
+# a cada ANOMALY_REFRESH_SECONDS (padrão 300; 0 desliga): lê do sales_daily só os dias ainda não
+# processados, atualiza os estados e grava os dias sinalizados em anomalies. O histórico não é
+# relido; para recalcular do zero (vendas antigas alteradas, por exemplo), basta esvaziar as
+# duas tabelas.
+#
+# Um dia é sinalizado como:
+#   - spike / drop: o valor está a mais de THRESHOLD desvios da linha de base do seu dia da semana
+#   - shift: o nível se afastou mais de THRESHOLD desvios de 1, ou seja, uma alta ou queda
+#     moderada que se repete por vários dias (uma semana ruim, por exemplo)
+
+import math
+import os
+import threading
+import time
+from itertools import groupby
+from sqlalchemy import func, select, text, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from cache import response_cache
+from database import engine
+from models import Anomaly, AnomalyState, SalesDaily
+
+REFRESH_SECONDS = float(os.environ.get("ANOMALY_REFRESH_SECONDS", "300"))
+
+ALPHA = 0.2  # peso do dia na linha de base do seu dia da semana (~5 semanas de memória)
+ALPHA_DEVIATION = 0.05  # peso do dia na dispersão (~20 dias de memória)
+BETA = 0.3  # peso do dia no nível
+THRESHOLD = 3.0  # desvios para sinalizar
+WARMUP = 3  # semanas de histórico de cada dia da semana antes de sinalizar
+MIN_RESIDUALS = 14  # dias comparados com a linha de base antes de sinalizar
+MIN_RELATIVE_SD = 0.05  # desvio mínimo, em fração da linha de base
+
+# desvio do nível quando os dias variam ao acaso em torno da linha de base
+LEVEL_SD = math.sqrt(BETA / (2 - BETA))
+
+METRICS = ("orders", "revenue")
+
+
+class Series:
+    """Estado de uma série diária
+
+    A linha de base é a média exponencial de cada dia da semana (sábado vende mais que
+    segunda). A dispersão é uma só, relativa à linha de base e somada sobre todos os dias: com
+    uma por dia da semana, cada uma sairia de poucas semanas e oscilaria demais. Ela é o desvio
+    absoluto médio, que um dia fora do normal infla bem menos que a variância, e os dias
+    sinalizados não entram nela.
+    """
+
+    def __init__(self, weekday_mean=None, weekday_n=None, deviation=0.0, level=0.0):
+        self.weekday_mean = weekday_mean or [0.0] * 7
+        self.weekday_n = weekday_n or [0] * 7
+        self.deviation = deviation
+        self.level = level
+
+    def observe(self, weekday, value):
+        """Atualiza o estado com o valor de um dia fechado; devolve (tipo, esperado, score) ou None"""
+        mean, n = self.weekday_mean[weekday], self.weekday_n[weekday]
+        flag = None
+        if n and mean > 0:
+            residuals = sum(max(count - 1, 0) for count in self.weekday_n)
+            # desvio padrão de uma normal com esse desvio absoluto médio
+            sd = max(self.deviation * math.sqrt(math.pi / 2), MIN_RELATIVE_SD)
+            if n >= WARMUP and residuals >= MIN_RESIDUALS:
+                score = (value / mean - 1) / sd
+                # um valor extremo entra limitado na linha de base e no nível: um pico isolado
+                # não desloca a referência dos dias seguintes
+                value = min(max(value, mean * (1 - THRESHOLD * sd)), mean * (1 + THRESHOLD * sd))
+                self.level = (1 - BETA) * self.level + BETA * (value / mean - 1)
+                level_score = self.level / (sd * LEVEL_SD)
+                if abs(score) >= THRESHOLD:
+                    flag = ("spike" if score > 0 else "drop", mean, score)
+                elif abs(level_score) >= THRESHOLD:
+                    flag = ("shift", mean, level_score)
+
+            if flag is None:
+                # a própria linha de base tem erro (variância 1/n da do dia no começo, α/(2-α)
+                # depois), que é descontado do desvio observado
+                error = max(1 / n, ALPHA / (2 - ALPHA))
+                alpha = max(ALPHA_DEVIATION, 1 / (residuals + 1))
+                self.deviation += alpha * (abs(value / mean - 1) / math.sqrt(1 + error) - self.deviation)
+
+        # média exponencial; nas primeiras semanas, média simples
+        alpha = max(ALPHA, 1 / (n + 1))
+        self.weekday_mean[weekday] = mean + alpha * (value - mean)
+        self.weekday_n[weekday] = n + 1
+        return flag
+
+
+def closed_days(conn, after):
+    # pedidos e receita de cada dia fechado ainda não processado: total, por canal e por loja
+    last_day = select(func.max(SalesDaily.day)).scalar_subquery()
+    query = (
+        select(
+            SalesDaily.day,
+            SalesDaily.channel_id,
+            SalesDaily.store_id,
+            func.sum(SalesDaily.sales_count).label("orders"),
+            func.sum(SalesDaily.revenue).label("revenue"),
+        )
+        .filter(SalesDaily.sale_status_desc == "COMPLETED")
+        .filter(SalesDaily.day < last_day)
+        .group_by(
+            SalesDaily.day,
+            func.grouping_sets(tuple_(SalesDaily.channel_id), tuple_(SalesDaily.store_id), tuple_()),
+        )
+        .order_by(SalesDaily.day)
+    )
+    if after is not None:
+        query = query.filter(SalesDaily.day > after)
+    return conn.execute(query).mappings()
+
+
+def series_key(row):
+    if row["store_id"] is not None:
+        return "store", row["store_id"]
+    if row["channel_id"] is not None:
+        return "channel", row["channel_id"]
+    return "total", 0
+
+
+def detect_anomalies():
+    """Processa os dias fechados desde a última rodada; devolve quantos dias foram processados"""
+    # com várias instâncias da API, só uma processa por vez; as demais pulam a rodada
+    with engine.connect() as conn:
+        if not conn.execute(text("SELECT pg_try_advisory_lock(hashtext('detect_anomalies'))")).scalar():
+            return 0
+        try:
+            series, last_day = {}, None
+            for state in conn.execute(select(AnomalyState)).mappings():
+                series[state["scope"], state["key"], state["metric"]] = Series(
+                    state["weekday_mean"], state["weekday_n"], state["deviation"], state["level"]
+                )
+                last_day = max(last_day or state["last_day"], state["last_day"])
+
+            days, flags = 0, []
+            for day, rows in groupby(closed_days(conn, last_day), key=lambda row: row["day"]):
+                values = {}
+                for row in rows:
+                    scope, key = series_key(row)
+                    for metric in METRICS:
+                        values[scope, key, metric] = float(row[metric])
+                # uma série que já existia e não vendeu no dia recebe zero
+                weekday = (day.weekday() + 1) % 7  # domingo = 0, como no dow do Postgres
+                for name in series.keys() | values.keys():
+                    value = values.get(name, 0.0)
+                    flag = series.setdefault(name, Series()).observe(weekday, value)
+                    if flag:
+                        kind, expected, score = flag
+                        scope, key, metric = name
+                        flags.append({
+                            "day": day, "scope": scope, "key": key, "metric": metric, "kind": kind,
+                            "value": value, "expected": expected, "score": score,
+                        })
+                last_day = day
+                days += 1
+            if not days:
+                return 0
+
+            if flags:
+                statement = insert(Anomaly).values(flags)
+                conn.execute(statement.on_conflict_do_update(
+                    index_elements=["day", "scope", "key", "metric"],
+                    set_={column: statement.excluded[column] for column in ("kind", "value", "expected", "score")},
+                ))
+            states = [
+                {
+                    "scope": scope, "key": key, "metric": metric, "last_day": last_day,
+                    "weekday_mean": state.weekday_mean, "weekday_n": state.weekday_n,
+                    "deviation": state.deviation, "level": state.level,
+                }
+                for (scope, key, metric), state in series.items()
+            ]
+            statement = insert(AnomalyState).values(states)
+            conn.execute(statement.on_conflict_do_update(
+                index_elements=["scope", "key", "metric"],
+                set_={
+                    column: statement.excluded[column]
+                    for column in ("last_day", "weekday_mean", "weekday_n", "deviation", "level")
+                },
+            ))
+            conn.commit()
+            response_cache.invalidate("anomalies")
+            return days
+        finally:
+            conn.rollback()
+            conn.execute(text("SELECT pg_advisory_unlock(hashtext('detect_anomalies'))"))
+
+
+class AnomalyRefresher(threading.Thread):
+    def __init__(self, interval=REFRESH_SECONDS):
+        super().__init__(name="anomaly-refresh", daemon=True)
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            started = time.perf_counter()
+            try:
+                days = detect_anomalies()
+                if days:
+                    print(f"anomalias: {days} dia(s) processado(s) em {time.perf_counter() - started:.2f}s", flush=True)
+            except Exception as error:
+                # como no heatmap: uma falha não derruba a thread, tentamos na próxima rodada
+                print(f"falha ao detectar anomalias: {error}", flush=True)
+            self.stopped.wait(self.interval)
+
+    def stop(self):
+        self.stopped.set()
@@ -0,0 +1,159 @@
+# Abaixo temos o cache de respostas da API. As rotas de leitura do dashboard ficam guardadas
+# em memória (LRU limitado em bytes), cada uma com seu TTL, e a chave é o caminho mais os
+# parâmetros da query. Toda resposta leva um ETag: quando o front repete a requisição com
+# If-None-Match e o conteúdo não mudou, devolvemos 304 sem executar nenhuma consulta.
+#
+# As entradas também são invalidadas por "tags": os triggers dos rollups enviam
+# NOTIFY dashboard_changed ('sales' ou 'customers') a cada carga, que o notifications.py
+# repassa para cá, e o refresh.py invalida 'heatmap' depois de atualizar as views.
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from starlette.datastructures import Headers, MutableHeaders
+
+MAX_BYTES = int(os.environ.get("RESPONSE_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+# rota -> (TTL em segundos, tags que invalidam a rota)
+CACHED_ROUTES = {
+    "/getStats/stats": (60, {"sales", "customers"}),
+    "/weekdayAnalysis/weekdayAnalysis": (300, {"heatmap"}),
+    "/overviewSection/recent-activity": (10, {"sales", "customers"}),
+    "/query": (60, {"sales"}),
+    "/topProducts/topProducts": (60, {"sales"}),
+    "/customers/rfm": (300, {"sales"}),
+    "/customers/churnRisk": (60, {"sales"}),
+    "/operationTimes/percentiles": (60, {"sales"}),
+    "/comparison/comparison": (60, {"sales"}),
+    "/anomalies/anomalies": (300, {"anomalies"}),
+    "/anomalies/days": (300, {"anomalies"}),
+}
+
+
+class ResponseCache:
+    def __init__(self, max_bytes=MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.entries = OrderedDict()  # chave -> (expira_em, tags, etag, headers, body)
+        self.lock = threading.Lock()
+        self.generation = 0  # muda a cada invalidação
+        self.hits = self.misses = self.revalidated = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, ttl, tags, etag, headers, body, generation):
+        with self.lock:
+            # a resposta foi calculada antes de uma invalidação: pode estar desatualizada
+            if generation != self.generation:
+                return
+            if key in self.entries:
+                self._remove(key)
+            if len(body) > self.max_bytes:
+                return
+            self.entries[key] = (time.monotonic() + ttl, tags, etag, headers, body)
+            self.size += len(body)
+            # descarta as menos usadas até voltar ao limite de memória
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+
+    def invalidate(self, tag=None):
+        # sem tag, esvazia o cache inteiro
+        with self.lock:
+            self.generation += 1
+            for key in [key for key, entry in self.entries.items() if tag is None or tag in entry[1]]:
+                self._remove(key)
+
+    def _remove(self, key):
+        self.size -= len(self.entries.pop(key)[4])
+
+
+response_cache = ResponseCache()
+
+
+def etag_matches(request_headers, etag):
+    values = request_headers.get("if-none-match")
+    if not values:
+        return False
+    return values.strip() == "*" or etag in [value.strip() for value in values.split(",")]
+
+
+class ResponseCacheMiddleware:
+    # middleware ASGI: só atua nos GETs das rotas em CACHED_ROUTES
+    def __init__(self, app, cache=response_cache):
+        self.app = app
+        self.cache = cache
+
+    async def __call__(self, scope, receive, send):
+        route = CACHED_ROUTES.get(scope.get("path")) if scope["type"] == "http" else None
+        if route is None or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+
+        ttl, tags = route
+        request_headers = Headers(scope=scope)
+        params = sorted(pair for pair in scope["query_string"].decode("latin-1").split("&") if pair)
+        key = scope["path"] + "?" + "&".join(params)
+
+        entry = self.cache.get(key)
+        if entry is not None:
+            _, _, etag, headers, body = entry
+            if etag_matches(request_headers, etag):
+                self.cache.revalidated += 1
+                await self.send_not_modified(send, etag)
+            else:
+                await self.send_cached(send, headers, body)
+            return
+
+        # miss: executamos a rota guardando o corpo para calcular o ETag
+        generation = self.cache.generation
+        start = {}
+        chunks = []
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                start.update(message)
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+                if not message.get("more_body", False):
+                    await finish()
+
+        async def finish():
+            body = b"".join(chunks)
+            if start["status"] != 200:
+                await send(start)
+                await send({"type": "http.response.body", "body": body})
+                return
+            etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+            headers = MutableHeaders(raw=list(start["headers"]))
+            headers["etag"] = etag
+            headers["cache-control"] = "no-cache"  # o navegador sempre revalida via ETag
+            self.cache.put(key, ttl, tags, etag, headers.raw, body, generation)
+            if etag_matches(request_headers, etag):
+                await self.send_not_modified(send, etag)
+            else:
+                await self.send_cached(send, headers.raw, body)
+
+        await self.app(scope, receive, capture)
+
+    async def send_cached(self, send, headers, body):
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+    async def send_not_modified(self, send, etag):
+        headers = MutableHeaders()
+        headers["etag"] = etag
+        headers["cache-control"] = "no-cache"
+        await send({"type": "http.response.start", "status": 304, "headers": headers.raw})
+        await send({"type": "http.response.body", "body": b""})
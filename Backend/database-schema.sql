@@ -96,6 +96,8 @@ CREATE TABLE customers (
     receive_promotions_sms BOOLEAN DEFAULT false,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
+-- range predicates from the API's period filters (created_at >= x AND created_at < y)
+CREATE INDEX idx_customers_created_at ON customers(created_at);
 
 CREATE TABLE sales (
     id SERIAL PRIMARY KEY,
@@ -129,6 +131,13 @@ CREATE TABLE sales (
     increase_reason VARCHAR(300),
     origin VARCHAR(100) DEFAULT 'POS'
 );
+CREATE INDEX idx_sales_created_at ON sales(created_at);
+-- per-store rankings (/topProducts with a store filter) and /query store slices
+CREATE INDEX idx_sales_store_created_at ON sales(store_id, created_at);
+-- not an index: statistics on the hour/weekday filters of /query and /topProducts, which
+-- the planner otherwise estimates at a few rows and answers with nested loops
+CREATE STATISTICS sales_created_at_parts
+    ON (EXTRACT(hour FROM created_at)), (EXTRACT(dow FROM created_at)) FROM sales;
 
 CREATE TABLE product_sales (
     id SERIAL PRIMARY KEY,
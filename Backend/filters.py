@@ -0,0 +1,99 @@
+# Abaixo temos a camada de filtros de período compartilhada pelos routers. Ela converte os
+# parâmetros de data enviados pelo front (mês, semana, ano, intervalo de datas ou últimos N
+# dias) em um intervalo [início, fim) e aplica `coluna >= início AND coluna < fim` nas
+# consultas. Diferente de extract('month', created_at) == mês, esse predicado pode usar os
+# índices sobre created_at, então a consulta lê apenas as linhas do período.
+
+from calendar import monthrange
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Optional
+from fastapi import HTTPException, Query
+from sqlalchemy import Date
+
+
+@dataclass(frozen=True)
+class DateRange:
+    start: Optional[datetime] = None  # inclusivo
+    end: Optional[datetime] = None    # exclusivo
+
+    def apply(self, query, column):
+        # colunas DATE (como o `day` dos rollups) são comparadas com datas,
+        # as demais (created_at) com datetimes à meia-noite
+        as_date = isinstance(column.type, Date)
+        if self.start is not None:
+            query = query.filter(column >= (self.start.date() if as_date else self.start))
+        if self.end is not None:
+            query = query.filter(column < (self.end.date() if as_date else self.end))
+        return query
+
+
+def midnight(day):
+    return datetime.combine(day, datetime.min.time())
+
+
+def shift(day, days):
+    # o fim do intervalo é exclusivo (o dia seguinte ao último), e depois de date.max não
+    # existe dia: períodos que passam dos limites de date viram 422, não OverflowError
+    try:
+        return day + timedelta(days=days)
+    except OverflowError:
+        raise HTTPException(status_code=422, detail="Período fora das datas suportadas")
+
+
+def latest_year(month, day=1):
+    # sem ano informado, usamos a ocorrência mais recente que já começou
+    today = date.today()
+    return today.year if date(today.year, month, day) <= today else today.year - 1
+
+
+def period_filter(
+    month: Optional[int] = Query(None, ge=1, le=12, description="Mês (1-12); sem `year`, o mais recente"),
+    week: Optional[int] = Query(None, ge=1, le=53, description="Semana ISO; sem `year`, a mais recente"),
+    year: Optional[int] = Query(None, ge=1900, le=9999, description="Ano; sozinho, filtra o ano inteiro"),
+    start_date: Optional[date] = Query(None, description="Primeiro dia do intervalo (inclusivo)"),
+    end_date: Optional[date] = Query(None, description="Último dia do intervalo (inclusivo)"),
+    last_days: Optional[int] = Query(None, ge=1, description="Últimos N dias, contando hoje"),
+) -> Optional[DateRange]:
+    # dependência do FastAPI: os routers recebem um DateRange (ou None, sem filtro)
+    kinds = [
+        name for name, given in (
+            ("month", month is not None),
+            ("week", week is not None),
+            ("start_date/end_date", start_date is not None or end_date is not None),
+            ("last_days", last_days is not None),
+        ) if given
+    ]
+    if len(kinds) > 1:
+        raise HTTPException(status_code=422, detail=f"Use apenas um tipo de período: {', '.join(kinds)}")
+
+    if month is not None:
+        first = date(year or latest_year(month), month, 1)
+        return DateRange(midnight(first), midnight(shift(first, monthrange(first.year, month)[1])))
+
+    if week is not None:
+        if year is None:
+            this_year = date.today().isocalendar().year
+            year = this_year if week <= date.today().isocalendar().week else this_year - 1
+        try:
+            first = date.fromisocalendar(year, week, 1)
+        except ValueError:
+            raise HTTPException(status_code=422, detail=f"O ano {year} não tem a semana {week}")
+        return DateRange(midnight(first), midnight(shift(first, 7)))
+
+    if start_date is not None or end_date is not None:
+        if start_date and end_date and start_date > end_date:
+            raise HTTPException(status_code=422, detail="start_date deve ser anterior a end_date")
+        return DateRange(
+            midnight(start_date) if start_date else None,
+            midnight(shift(end_date, 1)) if end_date else None,
+        )
+
+    if last_days is not None:
+        tomorrow = date.today() + timedelta(days=1)
+        return DateRange(midnight(shift(tomorrow, -last_days)), midnight(tomorrow))
+
+    if year is not None:
+        return DateRange(midnight(date(year, 1, 1)), midnight(shift(date(year, 12, 31), 1)))
+
+    return None
@@ -0,0 +1,43 @@
+-- Weekday x hour cube behind /weekdayAnalysis, as materialized views that the
+-- API refreshes concurrently on a schedule (see refresh.py). Readers never
+-- touch sales, so the heatmap costs the same however much history there is.
+--
+-- sales_hourly keeps every key the endpoint filters on. Its rows are about as
+-- many as there are store-hours with sales, so sales_hourly_channels rolls the
+-- stores up and serves every request that does not filter by store.
+-- Safe to run again: the API applies this file at startup.
+
+SELECT pg_advisory_xact_lock(hashtext('heatmap.sql'));
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS sales_hourly AS
+SELECT created_at::date AS day,
+       EXTRACT(dow FROM created_at)::smallint AS weekday,
+       EXTRACT(hour FROM created_at)::smallint AS hour,
+       store_id,
+       channel_id,
+       sale_status_desc,
+       COUNT(*) AS sales_count
+FROM sales
+GROUP BY 1, 2, 3, 4, 5, 6;
+
+-- REFRESH ... CONCURRENTLY needs a unique index over all rows
+CREATE UNIQUE INDEX IF NOT EXISTS sales_hourly_key
+    ON sales_hourly (day, hour, store_id, channel_id, sale_status_desc);
+CREATE INDEX IF NOT EXISTS sales_hourly_store_day ON sales_hourly (store_id, day);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS sales_hourly_channels AS
+SELECT day, weekday, hour, channel_id, sale_status_desc, SUM(sales_count)::bigint AS sales_count
+FROM sales_hourly
+GROUP BY 1, 2, 3, 4, 5;
+
+CREATE UNIQUE INDEX IF NOT EXISTS sales_hourly_channels_key
+    ON sales_hourly_channels (day, hour, channel_id, sale_status_desc);
+
+-- refreshes both views in dependency order; CONCURRENTLY keeps the old
+-- contents readable while the new ones are computed
+CREATE OR REPLACE PROCEDURE refresh_sales_hourly() LANGUAGE plpgsql AS $$
+BEGIN
+    REFRESH MATERIALIZED VIEW CONCURRENTLY sales_hourly;
+    COMMIT;
+    REFRESH MATERIALIZED VIEW CONCURRENTLY sales_hourly_channels;
+END $$;
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Load test for the dashboard API
+
+Replays the requests a dashboard load makes (stats, stats per month, the
+heatmap and recent activity) from `--concurrency` keep-alive clients for
+`--duration` seconds and reports requests/sec and latency percentiles.
+Run the API with RESPONSE_CACHE_MAX_BYTES=0 to measure the database path
+rather than the response cache.
+
+With `--delay-proxy PORT` it instead forwards PORT to the database
+(`--db-address`) and delays every packet by `--delay-ms` each way, to
+measure the API as if the database were on another host: point the API's
+DATABASE_URL at PORT and run the load test from another shell.
+"""
+
+import argparse
+import asyncio
+import http.client
+import json
+import threading
+import time
+from urllib.parse import urlsplit
+
+DASHBOARD_PATHS = [
+    "/getStats/stats",
+    "/getStats/stats?month=8",
+    "/getStats/stats?month=9",
+    "/weekdayAnalysis/weekdayAnalysis",
+    "/weekdayAnalysis/weekdayAnalysis?month=8",
+    "/overviewSection/recent-activity?limit=10",
+]
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def client(base_url, paths, deadline, offset, latencies, errors):
+    """One keep-alive connection replaying `paths` round-robin until `deadline`"""
+    url = urlsplit(base_url)
+    conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=30)
+    i = offset
+    while time.perf_counter() < deadline:
+        path = paths[i % len(paths)]
+        i += 1
+        started = time.perf_counter()
+        try:
+            conn.request("GET", path)
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                errors.append(response.status)
+                continue
+        except (OSError, http.client.HTTPException) as error:
+            errors.append(type(error).__name__)
+            conn.close()
+            conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=30)
+            continue
+        latencies.append(time.perf_counter() - started)
+    conn.close()
+
+
+def run(base_url, concurrency, duration, paths):
+    latencies, errors = [], []
+    deadline = time.perf_counter() + duration
+    threads = [
+        threading.Thread(target=client, args=(base_url, paths, deadline, n, latencies, errors))
+        for n in range(concurrency)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'url': base_url,
+        'concurrency': concurrency,
+        'requests': len(latencies),
+        'errors': len(errors),
+        'rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 1),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 1),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 1),
+    }
+
+
+async def forward(reader, writer, delay):
+    """Copies one direction of a proxied connection, `delay` seconds late"""
+    try:
+        while data := await reader.read(65536):
+            await asyncio.sleep(delay)
+            writer.write(data)
+            await writer.drain()
+    except OSError:
+        pass
+    finally:
+        writer.close()
+
+
+async def delay_proxy(port, db_address, delay):
+    host, _, db_port = db_address.rpartition(':')
+
+    async def handle(client_reader, client_writer):
+        db_reader, db_writer = await asyncio.open_connection(host, int(db_port))
+        await asyncio.gather(
+            forward(client_reader, db_writer, delay),
+            forward(db_reader, client_writer, delay),
+        )
+
+    server = await asyncio.start_server(handle, 'localhost', port)
+    print(f"forwarding localhost:{port} -> {db_address} with {delay * 1000:.0f} ms each way")
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the dashboard API')
+    parser.add_argument('--url', action='append',
+                        help='Base URL of the API; repeat to compare servers (default: http://localhost:8000)')
+    parser.add_argument('--concurrency', type=int, action='append',
+                        help='Concurrent clients; repeat for several levels (default: 16)')
+    parser.add_argument('--duration', type=float, default=20, help='Seconds per run (default: 20)')
+    parser.add_argument('--warmup', type=float, default=3, help='Seconds of warm-up before each run (default: 3)')
+    parser.add_argument('--json', help='Also write the results to this JSON file')
+    parser.add_argument('--delay-proxy', type=int, metavar='PORT',
+                        help='Instead of load testing, run a delaying proxy to the database on PORT')
+    parser.add_argument('--db-address', default='localhost:5432',
+                        help='Database host:port behind --delay-proxy (default: localhost:5432)')
+    parser.add_argument('--delay-ms', type=float, default=25,
+                        help='Delay added by --delay-proxy in each direction (default: 25)')
+    args = parser.parse_args()
+
+    if args.delay_proxy:
+        try:
+            asyncio.run(delay_proxy(args.delay_proxy, args.db_address, args.delay_ms / 1000))
+        except KeyboardInterrupt:
+            pass
+        return
+
+    results = []
+    for base_url in args.url or ['http://localhost:8000']:
+        for concurrency in args.concurrency or [16]:
+            if args.warmup:
+                run(base_url, concurrency, args.warmup, DASHBOARD_PATHS)
+            result = run(base_url, concurrency, args.duration, DASHBOARD_PATHS)
+            results.append(result)
+            print(f"{base_url}  c={concurrency:<3} {result['rps']:>8.1f} req/s  "
+                  f"p50 {result['p50_ms']:>7.1f} ms  p95 {result['p95_ms']:>7.1f} ms  "
+                  f"p99 {result['p99_ms']:>7.1f} ms  errors {result['errors']}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
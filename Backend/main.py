@@ -1,12 +1,59 @@
-from database import engine
+import os
+from contextlib import asynccontextmanager
+from database import async_engine, engine, is_statement_timeout, run_sql_file
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from routers import overviewSection, getStats, weekdayAnalysis, message
+from fastapi.responses import JSONResponse
+from sqlalchemy.exc import DBAPIError, TimeoutError as PoolTimeoutError
+from routers import overviewSection, getStats, weekdayAnalysis, message, metrics, query, topProducts, customers, operationTimes, comparison, anomalies
+from refresh import HeatmapRefresher, REFRESH_SECONDS
+from snapshot import SnapshotRefresher, REFRESH_SECONDS as SNAPSHOT_REFRESH_SECONDS
+from anomaly_detection import AnomalyRefresher, REFRESH_SECONDS as ANOMALY_REFRESH_SECONDS
+from cache import ResponseCacheMiddleware
+from notifications import NotificationListener
 import models
 
 
+@asynccontextmanager
+async def lifespan(app):
+    # conexão LISTEN única: invalida o cache a cada carga e alimenta o /overviewSection/stream
+    listener = NotificationListener()
+    listener.start()
+
+    # mantém as views do heatmap atualizadas enquanto a API estiver no ar
+    refresher = None
+    if REFRESH_SECONDS > 0:
+        refresher = HeatmapRefresher()
+        refresher.start()
+
+    # e o snapshot colunar usado pelo /query
+    snapshot_refresher = None
+    if SNAPSHOT_REFRESH_SECONDS > 0:
+        snapshot_refresher = SnapshotRefresher()
+        snapshot_refresher.start()
+
+    # e o detector de anomalias, que processa cada dia quando ele fecha
+    anomaly_refresher = None
+    if ANOMALY_REFRESH_SECONDS > 0:
+        anomaly_refresher = AnomalyRefresher()
+        anomaly_refresher.start()
+    yield
+    listener.stop()
+    if refresher:
+        refresher.stop()
+    if snapshot_refresher:
+        snapshot_refresher.stop()
+    if anomaly_refresher:
+        anomaly_refresher.stop()
+    await async_engine.dispose()
+
+
 def create_app():
-    app = FastAPI(title="Nola Challenge API")
+    app = FastAPI(title="Nola Challenge API", lifespan=lifespan)
+
+    # cache das respostas de leitura do dashboard (fica por dentro do CORS,
+    # então as respostas em cache e os 304 também recebem os cabeçalhos do CORS)
+    app.add_middleware(ResponseCacheMiddleware)
 
     # configuração do CORS para permitir requisições do front-end
     app.add_middleware(
@@ -15,16 +62,48 @@ def create_app():
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor", "X-Data-Source", "X-Snapshot-Age"],  # cursor da próxima página e origem dos dados do /query
     )
 
     # inclui os routers dos endpoints na aplicação FastAPI
     app.include_router(overviewSection.router, prefix="/overviewSection", tags=["overviewSection"])
     app.include_router(getStats.router, prefix="/getStats", tags=["getStats"])
     app.include_router(weekdayAnalysis.router, prefix="/weekdayAnalysis", tags=["weekdayAnalysis"])
+    app.include_router(topProducts.router, prefix="/topProducts", tags=["topProducts"])
+    app.include_router(customers.router, prefix="/customers", tags=["customers"])
+    app.include_router(operationTimes.router, prefix="/operationTimes", tags=["operationTimes"])
+    app.include_router(comparison.router, prefix="/comparison", tags=["comparison"])
+    app.include_router(anomalies.router, prefix="/anomalies", tags=["anomalies"])
     app.include_router(message.router, prefix="/message", tags=["message"])
+    app.include_router(metrics.router, tags=["metrics"])
+    app.include_router(query.router, tags=["query"])
+
+    # consultas que passaram do statement_timeout e requisições que não conseguiram
+    # uma conexão do pool a tempo viram erros HTTP claros, em vez de 500
+    @app.exception_handler(DBAPIError)
+    async def database_error(request, error):
+        if is_statement_timeout(error):
+            return JSONResponse(status_code=504, content={"detail": "A consulta excedeu o tempo limite"})
+        raise error
+
+    @app.exception_handler(PoolTimeoutError)
+    async def pool_timeout(request, error):
+        return JSONResponse(status_code=503, content={"detail": "Nenhuma conexão com o banco disponível"})
 
     # cria as tabelas no banco de dados, se ainda não existirem
     models.Base.metadata.create_all(bind=engine)
+
+    # instala os rollups (agregados diários) e os triggers que os mantêm atualizados
+    run_sql_file(os.path.join(os.path.dirname(__file__), "rollups.sql"))
+
+    # e as views materializadas do heatmap de dia da semana × hora
+    run_sql_file(os.path.join(os.path.dirname(__file__), "heatmap.sql"))
+
+    # e os triggers que notificam novas vendas/clientes para o stream de atividades
+    run_sql_file(os.path.join(os.path.dirname(__file__), "activity.sql"))
+
+    # e o log de alterações que o snapshot colunar copia de novo a cada atualização
+    run_sql_file(os.path.join(os.path.dirname(__file__), "snapshot.sql"))
     return app
 
 app = create_app()
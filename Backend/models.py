@@ -2,7 +2,8 @@
 # utilizando SQLAlchemy ORM. Cada classe representa uma tabela no banco de dados
 # e define suas colunas, tipos de dados e relacionamentos.
 
-from sqlalchemy import Column, Integer, String, ForeignKey, Boolean, Date, DateTime, DECIMAL, Float, CHAR
+from sqlalchemy import ARRAY, Column, Computed, Index, Integer, BigInteger, SmallInteger, String, ForeignKey, Boolean, Date, DateTime, DECIMAL, Float, CHAR, MetaData, Table
+from sqlalchemy import DDL, event
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from database import Base
@@ -153,6 +154,8 @@ class Item(Base):
 # ---------------- CUSTOMERS ----------------
 class Customer(Base):
     __tablename__ = "customers"
+    # filtros de período (filters.py) sobre a data de cadastro
+    __table_args__ = (Index("idx_customers_created_at", "created_at"),)
 
     id = Column(Integer, primary_key=True, index=True)
     customer_name = Column(String(100))
@@ -176,6 +179,12 @@ class Customer(Base):
 # ---------------- SALES ----------------
 class Sale(Base):
     __tablename__ = "sales"
+    # filtros de período (filters.py): created_at >= início AND created_at < fim; com loja,
+    # o ranking de produtos de uma loja e os recortes por loja do /query
+    __table_args__ = (
+        Index("idx_sales_created_at", "created_at"),
+        Index("idx_sales_store_created_at", "store_id", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     store_id = Column(Integer, ForeignKey("stores.id"), nullable=False)
@@ -210,6 +219,13 @@ class Sale(Base):
     payments = relationship("Payment", back_populates="sale")
     coupon_sales = relationship("CouponSale", back_populates="sale")
 
+# não é um índice: estatísticas da hora e do dia da semana de created_at, filtros do /query e
+# do /topProducts que o planner estimaria em poucas linhas (e responderia com nested loops)
+event.listen(Sale.__table__, "after_create", DDL(
+    "CREATE STATISTICS IF NOT EXISTS sales_created_at_parts "
+    "ON (EXTRACT(hour FROM created_at)), (EXTRACT(dow FROM created_at)) FROM sales"
+))
+
 # ---------------- PRODUCT SALES ----------------
 class ProductSale(Base):
     __tablename__ = "product_sales"
@@ -357,3 +373,107 @@ class CouponSale(Base):
     sale = relationship("Sale", back_populates="coupon_sales")
     coupon = relationship("Coupon", back_populates="coupon_sales")
 
+# ---------------- ROLLUPS ----------------
+# tabelas de agregados mantidas por triggers no banco (ver rollups.sql).
+# A API apenas lê delas; as escritas acontecem sozinhas a cada venda/cliente.
+class SalesDaily(Base):
+    __tablename__ = "sales_daily"
+
+    day = Column(Date, primary_key=True)
+    store_id = Column(Integer, primary_key=True)
+    channel_id = Column(Integer, primary_key=True)
+    sale_status_desc = Column(String(100), primary_key=True)
+    sales_count = Column(BigInteger, nullable=False, server_default="0")
+    revenue = Column(DECIMAL(14,2), nullable=False, server_default="0")
+
+class CustomersDaily(Base):
+    __tablename__ = "customers_daily"
+
+    day = Column(Date, primary_key=True)
+    customers_count = Column(BigInteger, nullable=False, server_default="0")
+
+class ProductDaily(Base):
+    __tablename__ = "product_daily"
+
+    day = Column(Date, primary_key=True)
+    channel_id = Column(Integer, primary_key=True)
+    sale_status_desc = Column(String(100), primary_key=True)
+    product_id = Column(Integer, primary_key=True)
+    items_count = Column(BigInteger, nullable=False, server_default="0")
+    quantity = Column(Float, nullable=False, server_default="0")
+    revenue = Column(DECIMAL(14,2), nullable=False, server_default="0")
+
+class CustomerStats(Base):
+    __tablename__ = "customer_stats"
+
+    customer_id = Column(Integer, primary_key=True)
+    first_purchase = Column(DateTime, nullable=False)
+    last_purchase = Column(DateTime, nullable=False)
+    orders_count = Column(BigInteger, nullable=False)
+    total_spent = Column(DECIMAL(14,2), nullable=False)
+    avg_ticket = Column(DECIMAL(14,2), Computed("round(total_spent / orders_count, 2)"))
+
+# histogramas em buckets logarítmicos dos tempos de produção e entrega (sketches de quantis)
+class OperationSketch(Base):
+    __tablename__ = "operation_sketches"
+
+    day = Column(Date, primary_key=True)
+    hour = Column(SmallInteger, primary_key=True)
+    channel_id = Column(Integer, primary_key=True)
+    bucket = Column(SmallInteger, primary_key=True)
+    production_count = Column(Integer, nullable=False, server_default="0")
+    delivery_count = Column(Integer, nullable=False, server_default="0")
+
+# ---------------- ANOMALIAS ----------------
+# estado das séries diárias e dias sinalizados pelo detector de anomalias (ver anomalies.py).
+# scope é "total", "channel" ou "store", e key o id do canal ou da loja (0 no total).
+class AnomalyState(Base):
+    __tablename__ = "anomaly_state"
+
+    scope = Column(String(10), primary_key=True)
+    key = Column(Integer, primary_key=True)
+    metric = Column(String(10), primary_key=True)
+    last_day = Column(Date, nullable=False)
+    weekday_mean = Column(ARRAY(Float), nullable=False)
+    weekday_n = Column(ARRAY(Integer), nullable=False)
+    deviation = Column(Float, nullable=False, server_default="0")
+    level = Column(Float, nullable=False, server_default="0")
+
+class Anomaly(Base):
+    __tablename__ = "anomalies"
+
+    day = Column(Date, primary_key=True)
+    scope = Column(String(10), primary_key=True)
+    key = Column(Integer, primary_key=True)
+    metric = Column(String(10), primary_key=True)
+    kind = Column(String(10), nullable=False)
+    value = Column(Float, nullable=False)
+    expected = Column(Float, nullable=False)
+    score = Column(Float, nullable=False)
+
+# ---------------- VIEWS ----------------
+# views materializadas do heatmap (ver heatmap.sql), atualizadas periodicamente pela API.
+# Ficam em um MetaData separado para o create_all não criá-las como tabelas comuns.
+views = MetaData()
+
+sales_hourly = Table(
+    "sales_hourly", views,
+    Column("day", Date),
+    Column("weekday", SmallInteger),
+    Column("hour", SmallInteger),
+    Column("store_id", Integer),
+    Column("channel_id", Integer),
+    Column("sale_status_desc", String(100)),
+    Column("sales_count", BigInteger),
+)
+
+# o mesmo cubo sem a loja, bem menor, para as consultas que não filtram por loja
+sales_hourly_channels = Table(
+    "sales_hourly_channels", views,
+    Column("day", Date),
+    Column("weekday", SmallInteger),
+    Column("hour", SmallInteger),
+    Column("channel_id", Integer),
+    Column("sale_status_desc", String(100)),
+    Column("sales_count", BigInteger),
+)
@@ -0,0 +1,126 @@
+# Abaixo temos a única conexão LISTEN da API e a distribuição das notificações do banco.
+#   - dashboard_changed (rollups.sql): invalida o cache de respostas
+#   - activity (activity.sql): novas vendas/clientes, repassadas a todos os inscritos no
+#     /overviewSection/stream
+# Uma conexão só atende todos os inscritos, então o banco não trabalha mais por ter mais
+# dashboards abertos, e quando nada acontece a conexão fica parada.
+
+import asyncio
+import json
+import select
+import threading
+from collections import namedtuple
+from datetime import datetime
+import psycopg2
+from cache import response_cache
+from database import URL_DATABASE
+
+# mesmo formato das linhas do feed (activity.py), para usar o mesmo describe()
+ActivityRow = namedtuple("ActivityRow", "type id name amount created_at")
+
+
+class ActivityBroadcaster:
+    # cada inscrito tem sua fila; quem não consome a tempo perde os eventos mais antigos
+    def __init__(self, queue_size=100):
+        self.queue_size = queue_size
+        self.subscribers = set()
+        self.lock = threading.Lock()
+        self.published = self.dropped = 0
+
+    def subscribe(self):
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        subscriber = (asyncio.get_running_loop(), queue)
+        with self.lock:
+            self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            self.subscribers.discard(subscriber)
+
+    def publish(self, event):
+        # chamado pela thread do LISTEN; entrega na event loop de cada inscrito
+        with self.lock:
+            subscribers = list(self.subscribers)
+            self.published += 1
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self.deliver, queue, event)
+            except RuntimeError:
+                # a event loop do inscrito já foi encerrada
+                self.unsubscribe((loop, queue))
+
+    def deliver(self, queue, event):
+        if queue.full():
+            queue.get_nowait()
+            self.dropped += 1
+        queue.put_nowait(event)
+
+
+broadcaster = ActivityBroadcaster()
+
+
+def activity_event(payload):
+    # payload do activity.sql -> (tipo, total de linhas do comando, linhas mais novas)
+    data = json.loads(payload)
+    rows = [
+        ActivityRow(
+            data["type"],
+            row["id"],
+            row.get("name"),
+            row.get("amount"),
+            datetime.fromisoformat(row["created_at"]),
+        )
+        for row in data["rows"]
+    ]
+    return data["type"], data["count"], rows
+
+
+class NotificationListener(threading.Thread):
+    # escuta os canais em uma conexão própria (fora do pool) e reconecta se ela cair
+    CHANNELS = ("dashboard_changed", "activity")
+
+    def __init__(self):
+        super().__init__(name="notifications", daemon=True)
+        self.stopped = threading.Event()
+
+    def dispatch(self, notify):
+        if notify.channel == "dashboard_changed":
+            response_cache.invalidate(notify.payload)
+        elif notify.channel == "activity":
+            broadcaster.publish(activity_event(notify.payload))
+
+    def run(self):
+        while not self.stopped.is_set():
+            try:
+                conn = psycopg2.connect(URL_DATABASE)
+            except psycopg2.Error as error:
+                print(f"sem conexão para LISTEN, tentando de novo: {error}", flush=True)
+                self.stopped.wait(5)
+                continue
+            try:
+                conn.autocommit = True
+                for channel in self.CHANNELS:
+                    conn.cursor().execute(f"LISTEN {channel}")
+                # o que mudou enquanto estávamos desconectados não foi notificado
+                response_cache.invalidate()
+                while not self.stopped.is_set():
+                    if select.select([conn], [], [], 1.0)[0]:
+                        conn.poll()
+                        # várias cargas seguidas: invalidamos cada tag uma vez só
+                        invalidated = set()
+                        for notify in conn.notifies:
+                            if notify.channel == "dashboard_changed":
+                                if notify.payload in invalidated:
+                                    continue
+                                invalidated.add(notify.payload)
+                            self.dispatch(notify)
+                        conn.notifies.clear()
+            except psycopg2.Error as error:
+                print(f"conexão de LISTEN caiu: {error}", flush=True)
+                self.stopped.wait(1)
+            finally:
+                conn.close()
+
+    def stop(self):
+        self.stopped.set()
@@ -0,0 +1,49 @@
+# Abaixo temos o agendador que atualiza as views materializadas do heatmap (heatmap.sql).
+# Ele roda em uma thread da própria API: atualiza uma vez logo na inicialização e depois a
+# cada HEATMAP_REFRESH_SECONDS segundos (padrão 300; 0 desliga). Como o REFRESH é
+# CONCURRENTLY, as leituras do endpoint continuam respondendo durante a atualização.
+
+import os
+import threading
+import time
+from sqlalchemy import text
+from database import engine
+from cache import response_cache
+
+REFRESH_SECONDS = float(os.environ.get("HEATMAP_REFRESH_SECONDS", "300"))
+
+
+def refresh_heatmap():
+    # com várias instâncias da API, só uma atualiza por vez; as demais pulam a rodada.
+    # AUTOCOMMIT porque o procedimento faz COMMIT entre as duas views
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if not conn.execute(text("SELECT pg_try_advisory_lock(hashtext('refresh_sales_hourly'))")).scalar():
+            return False
+        try:
+            conn.execute(text("CALL refresh_sales_hourly()"))
+            response_cache.invalidate("heatmap")
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(hashtext('refresh_sales_hourly'))"))
+        return True
+
+
+class HeatmapRefresher(threading.Thread):
+    def __init__(self, interval=REFRESH_SECONDS):
+        super().__init__(name="heatmap-refresh", daemon=True)
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            started = time.perf_counter()
+            try:
+                if refresh_heatmap():
+                    print(f"heatmap atualizado em {time.perf_counter() - started:.2f}s", flush=True)
+            except Exception as error:
+                # uma falha (banco fora do ar, por exemplo) não derruba a thread;
+                # tentamos de novo na próxima rodada
+                print(f"falha ao atualizar o heatmap: {error}", flush=True)
+            self.stopped.wait(self.interval)
+
+    def stop(self):
+        self.stopped.set()
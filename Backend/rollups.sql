@@ -0,0 +1,583 @@
+-- Rollup tables for the dashboard, kept current by triggers on the base tables.
+-- Every statement that writes sales/customers (INSERT, COPY, UPDATE, DELETE,
+-- TRUNCATE) folds its rows into the rollups through transition tables, so
+-- reads cost a function of the number of days, not of the number of sales.
+-- Safe to run again: the API applies this file at startup.
+--
+-- Upserts group and order their keys, so concurrent loads writing the same
+-- day take the row locks in the same order and cannot deadlock.
+--
+-- Every trigger also sends NOTIFY dashboard_changed with the base table name,
+-- which the API listens to for invalidating its response cache. Postgres
+-- folds identical notifications within a transaction into one.
+
+SELECT pg_advisory_xact_lock(hashtext('rollups.sql'));
+
+-- ---------------- SALES DAILY ----------------
+CREATE TABLE IF NOT EXISTS sales_daily (
+    day DATE NOT NULL,
+    store_id INTEGER NOT NULL,
+    channel_id INTEGER NOT NULL,
+    sale_status_desc VARCHAR(100) NOT NULL,
+    sales_count BIGINT NOT NULL DEFAULT 0,
+    revenue DECIMAL(14,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, store_id, channel_id, sale_status_desc)
+);
+
+CREATE OR REPLACE FUNCTION sales_daily_on_insert() RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO sales_daily AS d (day, store_id, channel_id, sale_status_desc, sales_count, revenue)
+    SELECT created_at::date, store_id, channel_id, sale_status_desc, COUNT(*), SUM(total_amount)
+    FROM new_sales
+    GROUP BY 1, 2, 3, 4
+    ORDER BY 1, 2, 3, 4
+    ON CONFLICT (day, store_id, channel_id, sale_status_desc) DO UPDATE
+    SET sales_count = d.sales_count + EXCLUDED.sales_count,
+        revenue = d.revenue + EXCLUDED.revenue;
+    PERFORM pg_notify('dashboard_changed', 'sales');
+    RETURN NULL;
+END $$;
+
+CREATE OR REPLACE FUNCTION sales_daily_on_delete() RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO sales_daily AS d (day, store_id, channel_id, sale_status_desc, sales_count, revenue)
+    SELECT created_at::date, store_id, channel_id, sale_status_desc, -COUNT(*), -SUM(total_amount)
+    FROM old_sales
+    GROUP BY 1, 2, 3, 4
+    ORDER BY 1, 2, 3, 4
+    ON CONFLICT (day, store_id, channel_id, sale_status_desc) DO UPDATE
+    SET sales_count = d.sales_count + EXCLUDED.sales_count,
+        revenue = d.revenue + EXCLUDED.revenue;
+    PERFORM pg_notify('dashboard_changed', 'sales');
+    RETURN NULL;
+END $$;
+
+-- an update moves a sale out of its old key and into its new one
+CREATE OR REPLACE FUNCTION sales_daily_on_update() RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO sales_daily AS d (day, store_id, channel_id, sale_status_desc, sales_count, revenue)
+    SELECT created_at::date, store_id, channel_id, sale_status_desc, SUM(sign), SUM(sign * total_amount)
+    FROM (
+        SELECT 1 AS sign, created_at, store_id, channel_id, sale_status_desc, total_amount FROM new_sales
+        UNION ALL
+        SELECT -1, created_at, store_id, channel_id, sale_status_desc, total_amount FROM old_sales
+    ) changes
+    GROUP BY 1, 2, 3, 4
+    ORDER BY 1, 2, 3, 4
+    ON CONFLICT (day, store_id, channel_id, sale_status_desc) DO UPDATE
+    SET sales_count = d.sales_count + EXCLUDED.sales_count,
+        revenue = d.revenue + EXCLUDED.revenue;
+    PERFORM pg_notify('dashboard_changed', 'sales');
+    RETURN NULL;
+END $$;
+
+CREATE OR REPLACE FUNCTION sales_daily_on_truncate() RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    TRUNCATE sales_daily;
+    PERFORM pg_notify('dashboard_changed', 'sales');
+    RETURN NULL;
+END $$;
+
+CREATE OR REPLACE TRIGGER sales_daily_insert AFTER INSERT ON sales
+    REFERENCING NEW TABLE AS new_sales
+    FOR EACH STATEMENT EXECUTE FUNCTION sales_daily_on_insert();
+CREATE OR REPLACE TRIGGER sales_daily_delete AFTER DELETE ON sales
+    REFERENCING OLD TABLE AS old_sales
+    FOR EACH STATEMENT EXECUTE FUNCTION sales_daily_on_delete();
+CREATE OR REPLACE TRIGGER sales_daily_update AFTER UPDATE ON sales
+    REFERENCING OLD TABLE AS old_sales NEW TABLE AS new_sales
+    FOR EACH STATEMENT EXECUTE FUNCTION sales_daily_on_update();
+CREATE OR REPLACE TRIGGER sales_daily_truncate AFTER TRUNCATE ON sales
+    FOR EACH STATEMENT EXECUTE FUNCTION sales_daily_on_truncate();
+
+-- Recomputes the rollup from scratch: first install on a database that
+-- already has sales, or after a load with the triggers disabled.
+-- Blocks writes to sales while it runs.
+CREATE OR REPLACE FUNCTION rebuild_sales_daily() RETURNS VOID LANGUAGE plpgsql AS $$
+BEGIN
+    LOCK TABLE sales IN SHARE MODE;
+    DELETE FROM sales_daily;
+    INSERT INTO sales_daily (day, store_id, channel_id, sale_status_desc, sales_count, revenue)
+    SELECT created_at::date, store_id, channel_id, sale_status_desc, COUNT(*), SUM(total_amount)
+    FROM sales
+    GROUP BY 1, 2, 3, 4;
+END $$;
+
+-- ---------------- CUSTOMERS DAILY ----------------
+-- customers without created_at are counted under '-infinity'
+CREATE TABLE IF NOT EXISTS customers_daily (
+    day DATE PRIMARY KEY,
+    customers_count BIGINT NOT NULL DEFAULT 0
+);
+
+CREATE OR REPLACE FUNCTION customers_daily_on_insert() RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO customers_daily AS d (day, customers_count)
+    SELECT COALESCE(created_at::date, '-infinity'), COUNT(*)
+    FROM new_customers
+    GROUP BY 1
+    ORDER BY 1
+    ON CONFLICT (day) DO UPDATE SET customers_count = d.customers_count + EXCLUDED.customers_count;
+    PERFORM pg_notify('dashboard_changed', 'customers');
+    RETURN NULL;
+END $$;
+
+CREATE OR REPLACE FUNCTION customers_daily_on_delete() RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO customers_daily AS d (day, customers_count)
+    SELECT COALESCE(created_at::date, '-infinity'), -COUNT(*)
+    FROM old_customers
+    GROUP BY 1
+    ORDER BY 1
+    ON CONFLICT (day) DO UPDATE SET customers_count = d.customers_count + EXCLUDED.customers_count;
+    PERFORM pg_notify('dashboard_changed', 'customers');
+    RETURN NULL;
+END $$;
+
+CREATE OR REPLACE FUNCTION customers_daily_on_truncate() RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    TRUNCATE customers_daily;
+    PERFORM pg_notify('dashboard_changed', 'customers');
+    RETURN NULL;
+END $$;
+
+CREATE OR REPLACE TRIGGER customers_daily_insert AFTER INSERT ON customers
+    REFERENCING NEW TABLE AS new_customers
+    FOR EACH STATEMENT EXECUTE FUNCTION customers_daily_on_insert();
+CREATE OR REPLACE TRIGGER customers_daily_delete AFTER DELETE ON customers
+    REFERENCING OLD TABLE AS old_customers
+    FOR EACH STATEMENT EXECUTE FUNCTION customers_daily_on_delete();
+CREATE OR REPLACE TRIGGER customers_daily_truncate AFTER TRUNCATE ON customers
+    FOR EACH STATEMENT EXECUTE FUNCTION customers_daily_on_truncate();
+
+CREATE OR REPLACE FUNCTION rebuild_customers_daily() RETURNS VOID LANGUAGE plpgsql AS $$
+BEGIN
+    LOCK TABLE customers IN SHARE MODE;
+    DELETE FROM customers_daily;
+    INSERT INTO customers_daily (day, customers_count)
+    SELECT COALESCE(created_at::date, '-infinity'), COUNT(*)
+    FROM customers
+    GROUP BY 1;
+END $$;
+
+-- ---------------- PRODUCT DAILY ----------------
+-- Items sold per day, channel, status and product, for the top-products
+-- ranking. There is no store or hour in the key: with ~60 sales per store and
+-- day, a day x store x product key holds about one item, and the rollup would
+-- be as large as product_sales. Rankings filtered by store or hour read the
+-- base tables instead.
+--
+-- The sale's day, channel and status come from sales, so product_sales
+-- triggers join their rows to it, an update to a sale moves its items to the
+-- new key, and deleting a sale subtracts its items before the cascade removes
+-- them (the cascaded delete then finds no sale and adds nothing).
+CREATE TABLE IF NOT EXISTS product_daily (
+    day DATE NOT NULL,
+    channel_id INTEGER NOT NULL,
+    sale_status_desc VARCHAR(100) NOT NULL,
+    product_id INTEGER NOT NULL,
+    items_count BIGINT NOT NULL DEFAULT 0,
+    quantity DOUBLE PRECISION NOT NULL DEFAULT 0,
+    revenue DECIMAL(14,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, channel_id, sale_status_desc, product_id)
+);
+
+CREATE OR REPLACE FUNCTION product_daily_on_insert() RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO product_daily AS d (day, channel_id, sale_status_desc, product_id, items_count, quantity, revenue)
+    SELECT s.created_at::date, s.channel_id, s.sale_status_desc, ps.product_id,
+           COUNT(*), SUM(ps.quantity), SUM(ps.total_price::DECIMAL(12,2))
+    FROM new_product_sales ps
+    JOIN sales s ON s.id = ps.sale_id
+    GROUP BY 1, 2, 3, 4
+    ORDER BY 1, 2, 3, 4
+    ON CONFLICT (day, channel_id, sale_status_desc, product_id) DO UPDATE
+    SET items_count = d.items_count + EXCLUDED.items_count,
+        quantity = d.quantity + EXCLUDED.quantity,
+        revenue = d.revenue + EXCLUDED.revenue;
+    PERFORM pg_notify('dashboard_changed', 'sales');
+    RETURN NULL;
+END $$;
+
+CREATE OR REPLACE FUNCTION product_daily_on_delete() RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO product_daily AS d (day, channel_id, sale_status_desc, product_id, items_count, quantity, revenue)
+    SELECT s.created_at::date, s.channel_id, s.sale_status_desc, ps.product_id,
+           -COUNT(*), -SUM(ps.quantity), -SUM(ps.total_price::DECIMAL(12,2))
+    FROM old_product_sales ps
+    JOIN sales s ON s.id = ps.sale_id
+    GROUP BY 1, 2, 3, 4
+    ORDER BY 1, 2, 3, 4
+    ON CONFLICT (day, channel_id, sale_status_desc, product_id) DO UPDATE
+    SET items_count = d.items_count + EXCLUDED.items_count,
+        quantity = d.quantity + EXCLUDED.quantity,
+        revenue = d.revenue + EXCLUDED.revenue;
+    PERFORM pg_notify('dashboard_changed', 'sales');
+    RETURN NULL;
+END $$;
+
+CREATE OR REPLACE FUNCTION product_daily_on_update() RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO product_daily AS d (day, channel_id, sale_status_desc, product_id, items_count, quantity, revenue)
+    SELECT s.created_at::date, s.channel_id, s.sale_status_desc, ps.product_id,
+           SUM(sign), SUM(sign * ps.quantity), SUM(sign * ps.total_price::DECIMAL(12,2))
+    FROM (
+        SELECT 1 AS sign, sale_id, product_id, quantity, total_price FROM new_product_sales
+        UNION ALL
+        SELECT -1, sale_id, product_id, quantity, total_price FROM old_product_sales
+    ) ps
+    JOIN sales s ON s.id = ps.sale_id
+    GROUP BY 1, 2, 3, 4
+    ORDER BY 1, 2, 3, 4
+    ON CONFLICT (day, channel_id, sale_status_desc, product_id) DO UPDATE
+    SET items_count = d.items_count + EXCLUDED.items_count,
+        quantity = d.quantity + EXCLUDED.quantity,
+        revenue = d.revenue + EXCLUDED.revenue;
+    PERFORM pg_notify('dashboard_changed', 'sales');
+    RETURN NULL;
+END $$;
+
+CREATE OR REPLACE FUNCTION product_daily_on_truncate() RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    TRUNCATE product_daily;
+    PERFORM pg_notify('dashboard_changed', 'sales');
+    RETURN NULL;
+END $$;
+
+-- a sale that changed day, channel or status moves its items to the new key
+CREATE OR REPLACE FUNCTION product_daily_on_sales_update() RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO product_daily AS d (day, channel_id, sale_status_desc, product_id, items_count, quantity, revenue)
+    SELECT s.day, s.channel_id, s.sale_status_desc, ps.product_id,
+           SUM(s.sign), SUM(s.sign * ps.quantity), SUM(s.sign * ps.total_price::DECIMAL(12,2))
+    FROM (
+        SELECT 1 AS sign, n.id, n.created_at::date AS day, n.channel_id, n.sale_status_desc
+        FROM new_sales n JOIN old_sales o ON o.id = n.id
+        WHERE (n.created_at::date, n.channel_id, n.sale_status_desc)
+              IS DISTINCT FROM (o.created_at::date, o.channel_id, o.sale_status_desc)
+        UNION ALL
+        SELECT -1, o.id, o.created_at::date, o.channel_id, o.sale_status_desc
+        FROM new_sales n JOIN old_sales o ON o.id = n.id
+        WHERE (n.created_at::date, n.channel_id, n.sale_status_desc)
+              IS DISTINCT FROM (o.created_at::date, o.channel_id, o.sale_status_desc)
+    ) s
+    JOIN product_sales ps ON ps.sale_id = s.id
+    GROUP BY 1, 2, 3, 4
+    ORDER BY 1, 2, 3, 4
+    ON CONFLICT (day, channel_id, sale_status_desc, product_id) DO UPDATE
+    SET items_count = d.items_count + EXCLUDED.items_count,
+        quantity = d.quantity + EXCLUDED.quantity,
+        revenue = d.revenue + EXCLUDED.revenue;
+    RETURN NULL;
+END $$;
+
+-- row level, so it runs while the sale's items still exist
+CREATE OR REPLACE FUNCTION product_daily_on_sales_delete() RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO product_daily AS d (day, channel_id, sale_status_desc, product_id, items_count, quantity, revenue)
+    SELECT OLD.created_at::date, OLD.channel_id, OLD.sale_status_desc, product_id,
+           -COUNT(*), -SUM(quantity), -SUM(total_price::DECIMAL(12,2))
+    FROM product_sales
+    WHERE sale_id = OLD.id
+    GROUP BY product_id
+    ORDER BY product_id
+    ON CONFLICT (day, channel_id, sale_status_desc, product_id) DO UPDATE
+    SET items_count = d.items_count + EXCLUDED.items_count,
+        quantity = d.quantity + EXCLUDED.quantity,
+        revenue = d.revenue + EXCLUDED.revenue;
+    RETURN OLD;
+END $$;
+
+CREATE OR REPLACE TRIGGER product_daily_insert AFTER INSERT ON product_sales
+    REFERENCING NEW TABLE AS new_product_sales
+    FOR EACH STATEMENT EXECUTE FUNCTION product_daily_on_insert();
+CREATE OR REPLACE TRIGGER product_daily_delete AFTER DELETE ON product_sales
+    REFERENCING OLD TABLE AS old_product_sales
+    FOR EACH STATEMENT EXECUTE FUNCTION product_daily_on_delete();
+CREATE OR REPLACE TRIGGER product_daily_update AFTER UPDATE ON product_sales
+    REFERENCING OLD TABLE AS old_product_sales NEW TABLE AS new_product_sales
+    FOR EACH STATEMENT EXECUTE FUNCTION product_daily_on_update();
+CREATE OR REPLACE TRIGGER product_daily_truncate AFTER TRUNCATE ON product_sales
+    FOR EACH STATEMENT EXECUTE FUNCTION product_daily_on_truncate();
+CREATE OR REPLACE TRIGGER product_daily_sales_update AFTER UPDATE ON sales
+    REFERENCING OLD TABLE AS old_sales NEW TABLE AS new_sales
+    FOR EACH STATEMENT EXECUTE FUNCTION product_daily_on_sales_update();
+CREATE OR REPLACE TRIGGER product_daily_sales_delete BEFORE DELETE ON sales
+    FOR EACH ROW EXECUTE FUNCTION product_daily_on_sales_delete();
+
+CREATE OR REPLACE FUNCTION rebuild_product_daily() RETURNS VOID LANGUAGE plpgsql AS $$
+BEGIN
+    LOCK TABLE sales, product_sales IN SHARE MODE;
+    DELETE FROM product_daily;
+    INSERT INTO product_daily (day, channel_id, sale_status_desc, product_id, items_count, quantity, revenue)
+    SELECT s.created_at::date, s.channel_id, s.sale_status_desc, ps.product_id,
+           COUNT(*), SUM(ps.quantity), SUM(ps.total_price::DECIMAL(12,2))
+    FROM product_sales ps
+    JOIN sales s ON s.id = ps.sale_id
+    GROUP BY 1, 2, 3, 4;
+END $$;
+
+-- ---------------- CUSTOMER STATS ----------------
+-- One row per customer with completed purchases: first and last purchase,
+-- number of orders, total spent and average ticket, for the RFM and churn
+-- endpoints. Cancelled sales are not purchases and are left out.
+--
+-- Inserts only add to the counters. An update or delete can move a customer's
+-- first or last purchase, which a counter cannot undo, so those statements
+-- recompute the customers they touched from sales through idx_sales_customer,
+-- created here with the trigger so that every database that has the trigger
+-- also has the index (generate_data.py drops and rebuilds it around bulk loads).
+CREATE INDEX IF NOT EXISTS idx_sales_customer ON sales(customer_id);
+
+CREATE TABLE IF NOT EXISTS customer_stats (
+    customer_id INTEGER PRIMARY KEY,
+    first_purchase TIMESTAMP NOT NULL,
+    last_purchase TIMESTAMP NOT NULL,
+    orders_count BIGINT NOT NULL,
+    total_spent DECIMAL(14,2) NOT NULL,
+    avg_ticket DECIMAL(14,2) GENERATED ALWAYS AS (round(total_spent / orders_count, 2)) STORED
+);
+CREATE INDEX IF NOT EXISTS idx_customer_stats_last_purchase ON customer_stats(last_purchase);
+
+CREATE OR REPLACE FUNCTION customer_stats_on_insert() RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO customer_stats AS c (customer_id, first_purchase, last_purchase, orders_count, total_spent)
+    SELECT customer_id, MIN(created_at), MAX(created_at), COUNT(*), SUM(total_amount)
+    FROM new_sales
+    WHERE customer_id IS NOT NULL AND sale_status_desc = 'COMPLETED'
+    GROUP BY 1
+    ORDER BY 1
+    ON CONFLICT (customer_id) DO UPDATE
+    SET first_purchase = LEAST(c.first_purchase, EXCLUDED.first_purchase),
+        last_purchase = GREATEST(c.last_purchase, EXCLUDED.last_purchase),
+        orders_count = c.orders_count + EXCLUDED.orders_count,
+        total_spent = c.total_spent + EXCLUDED.total_spent;
+    RETURN NULL;
+END $$;
+
+-- recomputes the customers whose sales were updated or deleted
+CREATE OR REPLACE FUNCTION customer_stats_recompute(customer_ids INTEGER[]) RETURNS VOID LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM 1 FROM customer_stats WHERE customer_id = ANY(customer_ids) ORDER BY customer_id FOR UPDATE;
+    DELETE FROM customer_stats WHERE customer_id = ANY(customer_ids);
+    INSERT INTO customer_stats (customer_id, first_purchase, last_purchase, orders_count, total_spent)
+    SELECT customer_id, MIN(created_at), MAX(created_at), COUNT(*), SUM(total_amount)
+    FROM sales
+    WHERE customer_id = ANY(customer_ids) AND sale_status_desc = 'COMPLETED'
+    GROUP BY 1
+    ORDER BY 1
+    ON CONFLICT (customer_id) DO UPDATE
+    SET first_purchase = EXCLUDED.first_purchase,
+        last_purchase = EXCLUDED.last_purchase,
+        orders_count = EXCLUDED.orders_count,
+        total_spent = EXCLUDED.total_spent;
+END $$;
+
+CREATE OR REPLACE FUNCTION customer_stats_on_update() RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM customer_stats_recompute(ARRAY(
+        SELECT n.customer_id FROM new_sales n JOIN old_sales o ON o.id = n.id
+        WHERE n.customer_id IS NOT NULL
+          AND (n.customer_id, n.created_at, n.sale_status_desc, n.total_amount)
+              IS DISTINCT FROM (o.customer_id, o.created_at, o.sale_status_desc, o.total_amount)
+        UNION
+        SELECT o.customer_id FROM new_sales n JOIN old_sales o ON o.id = n.id
+        WHERE o.customer_id IS NOT NULL
+          AND (n.customer_id, n.created_at, n.sale_status_desc, n.total_amount)
+              IS DISTINCT FROM (o.customer_id, o.created_at, o.sale_status_desc, o.total_amount)
+    ));
+    RETURN NULL;
+END $$;
+
+CREATE OR REPLACE FUNCTION customer_stats_on_delete() RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM customer_stats_recompute(ARRAY(
+        SELECT DISTINCT customer_id FROM old_sales
+        WHERE customer_id IS NOT NULL AND sale_status_desc = 'COMPLETED'
+    ));
+    RETURN NULL;
+END $$;
+
+CREATE OR REPLACE FUNCTION customer_stats_on_truncate() RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    TRUNCATE customer_stats;
+    RETURN NULL;
+END $$;
+
+CREATE OR REPLACE TRIGGER customer_stats_insert AFTER INSERT ON sales
+    REFERENCING NEW TABLE AS new_sales
+    FOR EACH STATEMENT EXECUTE FUNCTION customer_stats_on_insert();
+CREATE OR REPLACE TRIGGER customer_stats_update AFTER UPDATE ON sales
+    REFERENCING OLD TABLE AS old_sales NEW TABLE AS new_sales
+    FOR EACH STATEMENT EXECUTE FUNCTION customer_stats_on_update();
+CREATE OR REPLACE TRIGGER customer_stats_delete AFTER DELETE ON sales
+    REFERENCING OLD TABLE AS old_sales
+    FOR EACH STATEMENT EXECUTE FUNCTION customer_stats_on_delete();
+CREATE OR REPLACE TRIGGER customer_stats_truncate AFTER TRUNCATE ON sales
+    FOR EACH STATEMENT EXECUTE FUNCTION customer_stats_on_truncate();
+
+CREATE OR REPLACE FUNCTION rebuild_customer_stats() RETURNS VOID LANGUAGE plpgsql AS $$
+BEGIN
+    LOCK TABLE sales IN SHARE MODE;
+    DELETE FROM customer_stats;
+    INSERT INTO customer_stats (customer_id, first_purchase, last_purchase, orders_count, total_spent)
+    SELECT customer_id, MIN(created_at), MAX(created_at), COUNT(*), SUM(total_amount)
+    FROM sales
+    WHERE customer_id IS NOT NULL AND sale_status_desc = 'COMPLETED'
+    GROUP BY 1;
+END $$;
+
+-- ---------------- OPERATION SKETCHES ----------------
+-- Mergeable quantile sketches of production and delivery times, per day, hour
+-- and channel. Each sketch is a histogram over logarithmic buckets (as in
+-- DDSketch): a time t falls in bucket ceil(log_gamma(t)), with
+-- gamma = (1 + a) / (1 - a) and a = 1%, so any quantile read back from the
+-- merged buckets is within 1% of the exact one. Both times share the buckets,
+-- so one row holds both counts. Merging slices is a sum of counts and removing
+-- sales is a subtraction, so statement triggers keep the sketches exact, as
+-- they do sales_daily.
+--
+-- The store is left out of the key: with ~1.5 sales per store, day and hour a
+-- store sketch would be as large as the raw times. Store slices are small
+-- enough for the API to compute exactly from sales (idx_sales_store_created_at).
+CREATE OR REPLACE FUNCTION sketch_bucket(seconds NUMERIC) RETURNS SMALLINT
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT ceil(ln(seconds) / ln(1.01 / 0.99))::SMALLINT
+$$;
+
+-- representative time of a bucket, within 1% of every time in it
+CREATE OR REPLACE FUNCTION sketch_value(bucket INTEGER) RETURNS DOUBLE PRECISION
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT 2 * power(1.01 / 0.99, bucket) / (1.01 / 0.99 + 1)
+$$;
+
+CREATE TABLE IF NOT EXISTS operation_sketches (
+    day DATE NOT NULL,
+    hour SMALLINT NOT NULL,
+    channel_id INTEGER NOT NULL,
+    bucket SMALLINT NOT NULL,
+    production_count INTEGER NOT NULL DEFAULT 0,
+    delivery_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, hour, channel_id, bucket)
+);
+
+CREATE OR REPLACE FUNCTION operation_sketches_on_insert() RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO operation_sketches AS s (day, hour, channel_id, bucket, production_count, delivery_count)
+    SELECT created_at::date, EXTRACT(hour FROM created_at), channel_id, bucket, SUM(sign * production), SUM(sign * delivery)
+    FROM (
+        SELECT created_at, channel_id, sketch_bucket(production_seconds) AS bucket, sign, 1 AS production, 0 AS delivery
+        FROM (SELECT 1 AS sign, * FROM new_sales) new_rows WHERE production_seconds > 0
+        UNION ALL
+        SELECT created_at, channel_id, sketch_bucket(delivery_seconds), sign, 0, 1
+        FROM (SELECT 1 AS sign, * FROM new_sales) new_rows WHERE delivery_seconds > 0
+    ) times
+    GROUP BY 1, 2, 3, 4
+    ORDER BY 1, 2, 3, 4
+    ON CONFLICT (day, hour, channel_id, bucket) DO UPDATE
+    SET production_count = s.production_count + EXCLUDED.production_count,
+        delivery_count = s.delivery_count + EXCLUDED.delivery_count;
+    RETURN NULL;
+END $$;
+
+CREATE OR REPLACE FUNCTION operation_sketches_on_delete() RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO operation_sketches AS s (day, hour, channel_id, bucket, production_count, delivery_count)
+    SELECT created_at::date, EXTRACT(hour FROM created_at), channel_id, bucket, SUM(sign * production), SUM(sign * delivery)
+    FROM (
+        SELECT created_at, channel_id, sketch_bucket(production_seconds) AS bucket, sign, 1 AS production, 0 AS delivery
+        FROM (SELECT -1 AS sign, * FROM old_sales) old_rows WHERE production_seconds > 0
+        UNION ALL
+        SELECT created_at, channel_id, sketch_bucket(delivery_seconds), sign, 0, 1
+        FROM (SELECT -1 AS sign, * FROM old_sales) old_rows WHERE delivery_seconds > 0
+    ) times
+    GROUP BY 1, 2, 3, 4
+    ORDER BY 1, 2, 3, 4
+    ON CONFLICT (day, hour, channel_id, bucket) DO UPDATE
+    SET production_count = s.production_count + EXCLUDED.production_count,
+        delivery_count = s.delivery_count + EXCLUDED.delivery_count;
+    RETURN NULL;
+END $$;
+
+-- an update moves the sale's times out of their old buckets and into the new ones
+CREATE OR REPLACE FUNCTION operation_sketches_on_update() RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO operation_sketches AS s (day, hour, channel_id, bucket, production_count, delivery_count)
+    SELECT created_at::date, EXTRACT(hour FROM created_at), channel_id, bucket, SUM(sign * production), SUM(sign * delivery)
+    FROM (
+        SELECT created_at, channel_id, sketch_bucket(production_seconds) AS bucket, sign, 1 AS production, 0 AS delivery
+        FROM (
+            SELECT 1 AS sign, * FROM new_sales
+            UNION ALL
+            SELECT -1, * FROM old_sales
+        ) changes WHERE production_seconds > 0
+        UNION ALL
+        SELECT created_at, channel_id, sketch_bucket(delivery_seconds), sign, 0, 1
+        FROM (
+            SELECT 1 AS sign, * FROM new_sales
+            UNION ALL
+            SELECT -1, * FROM old_sales
+        ) changes WHERE delivery_seconds > 0
+    ) times
+    GROUP BY 1, 2, 3, 4
+    ORDER BY 1, 2, 3, 4
+    ON CONFLICT (day, hour, channel_id, bucket) DO UPDATE
+    SET production_count = s.production_count + EXCLUDED.production_count,
+        delivery_count = s.delivery_count + EXCLUDED.delivery_count;
+    RETURN NULL;
+END $$;
+
+CREATE OR REPLACE FUNCTION operation_sketches_on_truncate() RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    TRUNCATE operation_sketches;
+    RETURN NULL;
+END $$;
+
+CREATE OR REPLACE TRIGGER operation_sketches_insert AFTER INSERT ON sales
+    REFERENCING NEW TABLE AS new_sales
+    FOR EACH STATEMENT EXECUTE FUNCTION operation_sketches_on_insert();
+CREATE OR REPLACE TRIGGER operation_sketches_delete AFTER DELETE ON sales
+    REFERENCING OLD TABLE AS old_sales
+    FOR EACH STATEMENT EXECUTE FUNCTION operation_sketches_on_delete();
+CREATE OR REPLACE TRIGGER operation_sketches_update AFTER UPDATE ON sales
+    REFERENCING OLD TABLE AS old_sales NEW TABLE AS new_sales
+    FOR EACH STATEMENT EXECUTE FUNCTION operation_sketches_on_update();
+CREATE OR REPLACE TRIGGER operation_sketches_truncate AFTER TRUNCATE ON sales
+    FOR EACH STATEMENT EXECUTE FUNCTION operation_sketches_on_truncate();
+
+CREATE OR REPLACE FUNCTION rebuild_operation_sketches() RETURNS VOID LANGUAGE plpgsql AS $$
+BEGIN
+    LOCK TABLE sales IN SHARE MODE;
+    DELETE FROM operation_sketches;
+    INSERT INTO operation_sketches (day, hour, channel_id, bucket, production_count, delivery_count)
+    SELECT created_at::date, EXTRACT(hour FROM created_at), channel_id, bucket, SUM(production), SUM(delivery)
+    FROM (
+        SELECT created_at, channel_id, sketch_bucket(production_seconds) AS bucket, 1 AS production, 0 AS delivery
+        FROM sales WHERE production_seconds > 0
+        UNION ALL
+        SELECT created_at, channel_id, sketch_bucket(delivery_seconds), 0, 1
+        FROM sales WHERE delivery_seconds > 0
+    ) times
+    GROUP BY 1, 2, 3, 4;
+END $$;
+
+-- ---------------- BACKFILL ----------------
+-- a database that already had data when the rollups were installed
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM sales_daily) AND EXISTS (SELECT 1 FROM sales) THEN
+        PERFORM rebuild_sales_daily();
+    END IF;
+    IF NOT EXISTS (SELECT 1 FROM customers_daily) AND EXISTS (SELECT 1 FROM customers) THEN
+        PERFORM rebuild_customers_daily();
+    END IF;
+    IF NOT EXISTS (SELECT 1 FROM product_daily) AND EXISTS (SELECT 1 FROM product_sales) THEN
+        PERFORM rebuild_product_daily();
+    END IF;
+    IF NOT EXISTS (SELECT 1 FROM customer_stats) AND EXISTS (SELECT 1 FROM sales WHERE customer_id IS NOT NULL) THEN
+        PERFORM rebuild_customer_stats();
+    END IF;
+    IF NOT EXISTS (SELECT 1 FROM operation_sketches) AND EXISTS (SELECT 1 FROM sales) THEN
+        PERFORM rebuild_operation_sketches();
+    END IF;
+END $$;
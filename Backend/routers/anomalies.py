@@ -0,0 +1,104 @@
+# Abaixo temos o router das anomalias ("aconteceu algo fora do normal nas vendas?"). Os dias
+# sinalizados já estão na tabela anomalies, gravada pelo detector (anomaly_detection.py) a cada
+# dia que fecha; aqui só lemos e filtramos.
+#
+# Um evento que atinge a rede toda (uma promoção, uma semana de problema operacional) aparece
+# no total e em muitas lojas no mesmo dia; o /anomalies/days conta as séries sinalizadas por
+# dia, para esses dias se destacarem do ruído de uma loja isolada.
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import Integer, Numeric, and_, func, literal, or_, select
+from typing import List, Literal, Optional
+from anomaly_detection import THRESHOLD
+from database import get_async_db
+from filters import DateRange, period_filter
+from models import Anomaly, Channel, Store
+
+router = APIRouter()
+
+
+def flagged(query, period, metric, min_score):
+    query = query.filter(Anomaly.metric == metric).filter(func.abs(Anomaly.score) >= min_score)
+    if period:
+        query = period.apply(query, Anomaly.day)
+    return query
+
+
+@router.get("/anomalies")
+async def get_anomalies(
+    db: AsyncSession = Depends(get_async_db),
+    period: Optional[DateRange] = Depends(period_filter),
+    metric: Literal["orders", "revenue"] = Query("orders", description="Pedidos ou receita"),
+    scope: Optional[List[Literal["total", "channel", "store"]]] = Query(None, description="Total, canais e/ou lojas"),
+    kind: Optional[List[Literal["spike", "drop", "shift"]]] = Query(None, description="Pico, queda ou mudança de nível"),
+    store_id: Optional[List[int]] = Query(None, description="Uma ou mais lojas"),
+    channel_id: Optional[List[int]] = Query(None, description="Um ou mais canais"),
+    min_score: float = Query(THRESHOLD, ge=THRESHOLD, description="Desvios mínimos da linha de base"),
+    limit: int = Query(100, ge=1, le=1000),
+):
+    query = (
+        select(
+            Anomaly.day,
+            Anomaly.scope,
+            Anomaly.key.label("id"),
+            func.coalesce(Store.name, Channel.name, literal("Total")).label("name"),
+            Anomaly.kind,
+            func.round(Anomaly.value.cast(Numeric), 2).label("value"),
+            func.round(Anomaly.expected.cast(Numeric), 2).label("expected"),
+            func.round((Anomaly.value / Anomaly.expected * 100 - 100).cast(Numeric), 1).label("change_pct"),
+            func.round(Anomaly.score.cast(Numeric), 1).label("score"),
+        )
+        .outerjoin(Store, and_(Anomaly.scope == "store", Store.id == Anomaly.key))
+        .outerjoin(Channel, and_(Anomaly.scope == "channel", Channel.id == Anomaly.key))
+    )
+    query = flagged(query, period, metric, min_score)
+    if scope:
+        query = query.filter(Anomaly.scope.in_(scope))
+    if kind:
+        query = query.filter(Anomaly.kind.in_(kind))
+
+    # com filtro de loja e/ou canal, só as séries dessas lojas e canais
+    series = []
+    if store_id:
+        series.append(and_(Anomaly.scope == "store", Anomaly.key.in_(store_id)))
+    if channel_id:
+        series.append(and_(Anomaly.scope == "channel", Anomaly.key.in_(channel_id)))
+    if series:
+        query = query.filter(or_(*series))
+
+    query = query.order_by(Anomaly.day.desc(), func.abs(Anomaly.score).desc()).limit(limit)
+    results = await db.execute(query)
+
+    return [dict(row) for row in results.mappings()]
+
+
+@router.get("/days")
+async def get_anomaly_days(
+    db: AsyncSession = Depends(get_async_db),
+    period: Optional[DateRange] = Depends(period_filter),
+    metric: Literal["orders", "revenue"] = Query("orders", description="Pedidos ou receita"),
+    min_score: float = Query(THRESHOLD, ge=THRESHOLD, description="Desvios mínimos da linha de base"),
+    limit: int = Query(20, ge=1, le=366),
+):
+    def count(scope):
+        return func.count().filter(Anomaly.scope == scope).cast(Integer).label(f"{scope}_flags")
+
+    # primeiro os dias sinalizados no total, depois os com mais lojas sinalizadas
+    total_kind = func.max(Anomaly.kind).filter(Anomaly.scope == "total")
+    query = select(
+        Anomaly.day,
+        total_kind.label("total_kind"),
+        count("channel"),
+        count("store"),
+        func.mode().within_group(Anomaly.kind).filter(Anomaly.scope == "store").label("store_kind"),
+    )
+    query = flagged(query, period, metric, min_score)
+    query = (
+        query.group_by(Anomaly.day)
+        .order_by(total_kind.is_(None), func.count().filter(Anomaly.scope == "store").desc(), Anomaly.day.desc())
+        .limit(limit)
+    )
+    results = await db.execute(query)
+
+    return [dict(row) for row in results.mappings()]
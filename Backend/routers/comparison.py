@@ -0,0 +1,160 @@
+# Abaixo temos o router de comparação entre períodos ("meu ticket médio está caindo: é o
+# canal ou a loja?"). O período escolhido pelo front (filters.py) é comparado com o período
+# anterior de mesmo tamanho ou com o mesmo período do ano passado, no total e quebrado por loja
+# ou canal.
+#
+# As duas janelas saem de uma única consulta sobre o rollup sales_daily: cada soma tem um
+# FILTER com a sua janela (agregação condicional), então comparar custa uma leitura, e não duas.
+# Deltas e contribuições são calculados aqui, a partir das poucas linhas agregadas.
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import BigInteger, and_, func, or_, select
+from datetime import timedelta
+from typing import List, Literal, Optional
+from database import get_async_db
+from filters import DateRange, period_filter
+from models import Channel, SalesDaily, Store
+
+router = APIRouter()
+
+# dimensão -> (coluna do rollup, tabela com o nome)
+DIMENSIONS = {
+    "store": (SalesDaily.store_id, Store),
+    "channel": (SalesDaily.channel_id, Channel),
+}
+
+
+def a_year_before(day):
+    try:
+        return day.replace(year=day.year - 1)
+    except ValueError:
+        # 29 de fevereiro
+        return day.replace(year=day.year - 1, day=28)
+
+
+def windows(period, baseline):
+    """Devolve as janelas [início, fim) atual e de comparação, em datas"""
+    if period is None or period.start is None or period.end is None:
+        raise HTTPException(status_code=422, detail="Informe um período com início e fim para comparar")
+    start, end = period.start.date(), period.end.date()
+    if baseline == "previous":
+        return (start, end), (start - (end - start), start)
+    return (start, end), (a_year_before(start), a_year_before(end))
+
+
+def change(current, previous):
+    current, previous = float(current), float(previous)
+    return {
+        "current": round(current, 2),
+        "baseline": round(previous, 2),
+        "delta": round(current - previous, 2),
+        "delta_pct": round((current - previous) / previous * 100, 2) if previous else None,
+    }
+
+
+def compare(rows, total):
+    """Deltas de cada linha e a contribuição de cada uma para a mudança do total
+
+    Receita e pedidos são somas: a contribuição é o delta da linha, e a parcela é a fração do
+    delta total. O ticket médio é uma razão: a mudança do total se divide exatamente entre as
+    linhas como peso_atual × ticket_atual - peso_anterior × ticket_anterior (peso = fração dos
+    pedidos), e cada contribuição se separa em efeito de taxa (o ticket da linha mudou) e efeito
+    de mix (a linha ganhou ou perdeu peso).
+    """
+    result = []
+    for row in rows:
+        item = {key: value for key, value in row.items() if not key.startswith(("revenue_", "orders_"))}
+        for metric in ("revenue", "orders"):
+            item[metric] = change(row[f"{metric}_current"], row[f"{metric}_baseline"])
+            total_delta = total[metric]["delta"]
+            item[metric]["share_of_change_pct"] = (
+                round(item[metric]["delta"] / total_delta * 100, 2) if total_delta else None
+            )
+
+        orders_now, orders_before = row["orders_current"], row["orders_baseline"]
+        ticket_now = float(row["revenue_current"]) / orders_now if orders_now else None
+        ticket_before = float(row["revenue_baseline"]) / orders_before if orders_before else None
+        weight_now = orders_now / total["orders"]["current"] if total["orders"]["current"] else 0
+        weight_before = orders_before / total["orders"]["baseline"] if total["orders"]["baseline"] else 0
+        contribution = weight_now * (ticket_now or 0) - weight_before * (ticket_before or 0)
+        if ticket_now is not None and ticket_before is not None:
+            rate = weight_now * (ticket_now - ticket_before)
+        else:
+            # a linha só existe em uma das janelas: toda a contribuição é de mix
+            rate = 0.0
+        item["ticket"] = {
+            **change(ticket_now or 0, ticket_before or 0),
+            "contribution": round(contribution, 2),
+            "rate_effect": round(rate, 2),
+            "mix_effect": round(contribution - rate, 2),
+        }
+        if ticket_now is None or ticket_before is None:
+            item["ticket"]["delta_pct"] = None
+        result.append(item)
+    return result
+
+
+@router.get("/comparison")
+async def get_comparison(
+    db: AsyncSession = Depends(get_async_db),
+    period: Optional[DateRange] = Depends(period_filter),
+    baseline: Literal["previous", "last_year"] = Query("previous", description="Período anterior de mesmo tamanho ou o mesmo período do ano passado"),
+    dimension: Optional[Literal["store", "channel"]] = Query(None, description="Quebra por loja ou canal; vazio = só o total"),
+    sort_by: Literal["revenue", "orders", "ticket"] = Query("revenue", description="Ordena a quebra pela maior contribuição nesta medida"),
+    store_id: Optional[List[int]] = Query(None, description="Uma ou mais lojas"),
+    channel_id: Optional[List[int]] = Query(None, description="Um ou mais canais"),
+    status: List[str] = Query(["COMPLETED"], description="Um ou mais status de venda"),
+    limit: int = Query(50, ge=1, le=500),
+):
+    (current_start, current_end), (baseline_start, baseline_end) = windows(period, baseline)
+    current = and_(SalesDaily.day >= current_start, SalesDaily.day < current_end)
+    previous = and_(SalesDaily.day >= baseline_start, SalesDaily.day < baseline_end)
+
+    group = []
+    if dimension:
+        column, names = DIMENSIONS[dimension]
+        group = [column.label(f"{dimension}_id"), names.name.label(dimension)]
+    query = select(
+        *group,
+        func.coalesce(func.sum(SalesDaily.revenue).filter(current), 0).label("revenue_current"),
+        func.coalesce(func.sum(SalesDaily.revenue).filter(previous), 0).label("revenue_baseline"),
+        func.coalesce(func.sum(SalesDaily.sales_count).filter(current), 0).cast(BigInteger).label("orders_current"),
+        func.coalesce(func.sum(SalesDaily.sales_count).filter(previous), 0).cast(BigInteger).label("orders_baseline"),
+    ).filter(or_(current, previous))
+    if dimension:
+        query = query.join(names, names.id == column).group_by(*group)
+    if store_id:
+        query = query.filter(SalesDaily.store_id.in_(store_id))
+    if channel_id:
+        query = query.filter(SalesDaily.channel_id.in_(channel_id))
+    query = query.filter(SalesDaily.sale_status_desc.in_(status))
+
+    rows = [dict(row) for row in (await db.execute(query)).mappings()]
+
+    # o total é a soma das linhas: sai da mesma consulta
+    sums = {
+        key: sum(row[key] for row in rows)
+        for key in ("revenue_current", "revenue_baseline", "orders_current", "orders_baseline")
+    }
+    total = {
+        "revenue": change(sums["revenue_current"], sums["revenue_baseline"]),
+        "orders": change(sums["orders_current"], sums["orders_baseline"]),
+        "ticket": change(
+            sums["revenue_current"] / sums["orders_current"] if sums["orders_current"] else 0,
+            sums["revenue_baseline"] / sums["orders_baseline"] if sums["orders_baseline"] else 0,
+        ),
+    }
+
+    breakdown = []
+    if dimension:
+        breakdown = compare(rows, total)
+        key = "contribution" if sort_by == "ticket" else "delta"
+        breakdown.sort(key=lambda item: abs(item[sort_by][key]), reverse=True)
+
+    return {
+        "current": {"start": current_start, "end": current_end - timedelta(days=1)},
+        "baseline": {"start": baseline_start, "end": baseline_end - timedelta(days=1)},
+        "total": total,
+        "breakdown": breakdown[:limit],
+    }
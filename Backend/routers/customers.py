@@ -0,0 +1,119 @@
+# Abaixo temos o router de clientes: segmentos RFM (recência, frequência e valor) e a lista de
+# clientes em risco de churn. Tudo é lido do customer_stats (rollups.sql), que os triggers
+# mantêm com uma linha por cliente, então o custo depende do número de clientes, e não do
+# histórico de vendas.
+#
+# "Hoje" é a compra mais recente da base: com dados gerados até uma data passada, contar
+# a recência a partir do relógio deixaria todos os clientes inativos.
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import Date, Integer, and_, case, cast, func, literal, select
+from datetime import timedelta
+from database import get_analytics_db, get_async_db
+from models import Customer, CustomerStats
+
+router = APIRouter()
+
+# grade clássica de recência × frequência (notas de 1 a 5) -> segmento
+SEGMENTS = [
+    ("Campeões", (5, 5), (4, 5)),
+    ("Fiéis", (3, 4), (4, 5)),
+    ("Potenciais fiéis", (4, 5), (2, 3)),
+    ("Novos", (5, 5), (1, 1)),
+    ("Promissores", (4, 4), (1, 1)),
+    ("Precisam de atenção", (3, 3), (3, 3)),
+    ("Quase dormindo", (3, 3), (1, 2)),
+    ("Não podemos perder", (1, 2), (5, 5)),
+    ("Em risco", (1, 2), (3, 4)),
+    ("Hibernando", (1, 2), (1, 2)),
+]
+
+
+def score(column):
+    # quintis pela posição do cliente; empates (mesmo nº de pedidos, por exemplo) têm a mesma nota
+    return func.least(5, 1 + func.floor(func.percent_rank().over(order_by=column) * 5)).cast(Integer)
+
+
+async def reference_day(db):
+    last_purchase = (await db.execute(select(func.max(CustomerStats.last_purchase)))).scalar()
+    return last_purchase.date() if last_purchase else None
+
+
+@router.get("/rfm")
+async def get_rfm(db: AsyncSession = Depends(get_analytics_db)):
+    today = await reference_day(db)
+    if today is None:
+        return {"reference_date": None, "segments": []}
+
+    recency_days = literal(today, Date) - cast(CustomerStats.last_purchase, Date)
+    scored = select(
+        recency_days.label("recency_days"),
+        CustomerStats.orders_count,
+        CustomerStats.total_spent,
+        score(CustomerStats.last_purchase).label("r"),
+        score(CustomerStats.orders_count).label("f"),
+        score(CustomerStats.total_spent).label("m"),
+    ).subquery()
+
+    segment = case(
+        *[
+            (and_(scored.c.r.between(*recency), scored.c.f.between(*frequency)), name)
+            for name, recency, frequency in SEGMENTS
+        ]
+    ).label("segment")
+
+    query = (
+        select(
+            segment,
+            func.count().label("customers"),
+            func.round(func.avg(scored.c.recency_days), 1).label("avg_recency_days"),
+            func.round(func.avg(scored.c.orders_count), 1).label("avg_orders"),
+            func.round(func.avg(scored.c.total_spent), 2).label("avg_spent"),
+            func.round(func.avg(scored.c.m), 1).label("avg_monetary_score"),
+            func.sum(scored.c.total_spent).label("revenue"),
+        )
+        .group_by(segment)
+        .order_by(func.sum(scored.c.total_spent).desc())
+    )
+    results = await db.execute(query)
+
+    return {
+        "reference_date": today,
+        "segments": [dict(row) for row in results.mappings()],
+    }
+
+
+@router.get("/churnRisk")
+async def get_churn_risk(
+    db: AsyncSession = Depends(get_async_db),
+    min_orders: int = Query(3, ge=1, description="Mínimo de compras do cliente"),
+    inactive_days: int = Query(30, ge=1, description="Dias sem comprar"),
+    limit: int = Query(100, ge=1, le=1000),
+):
+    today = await reference_day(db)
+    if today is None:
+        return []
+
+    # os clientes que mais gastaram primeiro: são os que mais vale a pena recuperar
+    cutoff = today - timedelta(days=inactive_days - 1)
+    query = (
+        select(
+            CustomerStats.customer_id,
+            Customer.customer_name,
+            CustomerStats.orders_count,
+            CustomerStats.total_spent,
+            CustomerStats.avg_ticket,
+            CustomerStats.first_purchase,
+            CustomerStats.last_purchase,
+            (literal(today, Date) - cast(CustomerStats.last_purchase, Date)).label("days_inactive"),
+        )
+        .join(Customer, Customer.id == CustomerStats.customer_id)
+        .filter(CustomerStats.orders_count >= min_orders)
+        .filter(CustomerStats.last_purchase < cutoff)
+        .order_by(CustomerStats.total_spent.desc(), CustomerStats.customer_id)
+        .limit(limit)
+    )
+    results = await db.execute(query)
+
+    return [dict(row) for row in results.mappings()]
@@ -1,44 +1,42 @@
 # Abaixo temos o router do endpoint que será utilizado para calcular os status da página inicial
 # do dashboard. Nele retornamos o total obtido até agora desde o início do bd, o ganho de
 # vendas no total e o número de clientes cadastrados até o momento.
+#
+# Os totais são lidos dos rollups diários (sales_daily e customers_daily), que os triggers
+# do banco atualizam a cada venda/cliente inserido. Assim o custo da consulta depende do
+# número de dias com vendas, e não do tamanho da tabela sales. O período (mês, semana,
+# intervalo...) vem da dependência period_filter, compartilhada com os demais routers.
 
 from fastapi import APIRouter, Depends
-from sqlalchemy import func
-from sqlalchemy.orm import Session
-from database import get_db
-from models import Sale, Customer
+from sqlalchemy import func, select
+from typing import Optional
+from database import run_concurrently
+from filters import DateRange, period_filter
+from models import SalesDaily, CustomersDaily
 
 router = APIRouter()
 
 @router.get("/stats")
-def get_stats(db: Session = Depends(get_db), month: int = None):
-    # verificamos se recebemos algum input do front para filtrar por mês
-    # caso não, retornamos os totais gerais
-    if not month:
-        total_revenue = db.query(func.sum(Sale.total_amount)).scalar() or 0
-        total_sales = db.query(func.count(Sale.id)).scalar() 
-        total_customers = db.query(func.count(Customer.id)).scalar() 
-        customers_with_sales = db.query(func.count(func.distinct(Sale.customer_id))).scalar() if total_customers else 0
-        conversion_rate = (customers_with_sales / total_customers * 100) if total_customers else 0
-    else:
-        # caso tenhamos um mês, filtramos os dados para retornar apenas os
-        # totais daquele mês específico
-        total_revenue = (
-            db.query(func.sum(Sale.total_amount))
-            .filter(func.extract('month', Sale.created_at) == month)
-            .scalar() or 0
-        )
+async def get_stats(period: Optional[DateRange] = Depends(period_filter)):
+    # receita e nº de vendas em uma única consulta sobre o rollup
+    sales_query = select(
+        func.coalesce(func.sum(SalesDaily.revenue), 0),
+        func.coalesce(func.sum(SalesDaily.sales_count), 0)
+    )
 
-        total_sales = (
-            db.query(func.count(Sale.id))
-            .filter(func.extract('month', Sale.created_at) == month)
-            .scalar()
-        )
+    # caso o front envie um período, filtramos apenas os totais daquele período
+    if period:
+        sales_query = period.apply(sales_query, SalesDaily.day)
 
-        total_customers = db.query(func.count(Customer.id)).scalar()
+    customers_query = select(func.coalesce(func.sum(CustomersDaily.customers_count), 0))
+
+    # as duas consultas são independentes, então rodam ao mesmo tempo
+    sales_rows, customers_rows = await run_concurrently(sales_query, customers_query)
+    total_revenue, total_sales = sales_rows[0]
+    total_customers = customers_rows[0][0]
 
     return {
         "total_revenue": float(total_revenue),
-        "total_sales": total_sales,
-        "total_customers": total_customers,
+        "total_sales": int(total_sales),
+        "total_customers": int(total_customers),
     }
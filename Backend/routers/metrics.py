@@ -0,0 +1,34 @@
+# Abaixo temos o router com as métricas da API: o pool de conexões das rotas (checkouts,
+# espera por conexão, overflow, conexões em uso, tempo das consultas e timeouts), o cache
+# de respostas, o snapshot colunar e o stream de atividades. Serve para saber, num pico de tráfego, se estamos
+# esperando por conexão ou pelas consultas.
+
+from fastapi import APIRouter
+from analytics import compile_query
+from cache import response_cache
+from database import async_engine, pool_metrics
+from notifications import broadcaster
+from snapshot import snapshot
+
+router = APIRouter()
+
+@router.get("/metrics")
+async def metrics():
+    return {
+        "database": pool_metrics.report(async_engine.sync_engine.pool),
+        "response_cache": {
+            "entries": len(response_cache.entries),
+            "bytes": response_cache.size,
+            "max_bytes": response_cache.max_bytes,
+            "hits": response_cache.hits,
+            "misses": response_cache.misses,
+            "not_modified": response_cache.revalidated,
+        },
+        "query_shapes": compile_query.cache_info()._asdict(),
+        "snapshot": snapshot.stats(),
+        "activity_stream": {
+            "subscribers": len(broadcaster.subscribers),
+            "events_published": broadcaster.published,
+            "events_dropped": broadcaster.dropped,
+        },
+    }
@@ -0,0 +1,135 @@
+# Abaixo temos o router dos percentis de tempo de produção e de entrega ("meu tempo de entrega
+# piorou; em quais dias e horários?"). Os percentis saem dos sketches do rollups.sql
+# (operation_sketches): histogramas em buckets logarítmicos por dia, hora e canal, que se
+# somam para qualquer combinação de filtros. O valor devolvido fica a até 1% do percentil exato,
+# sem ordenar as vendas.
+#
+# Os sketches não têm loja; com filtro ou agrupamento por loja, os percentis são calculados
+# exatamente sobre as vendas da loja, que são poucas e vêm pelo índice (store_id, created_at).
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import Integer, and_, func, or_, select
+from typing import List, Literal, Optional
+from database import get_analytics_db
+from filters import DateRange, period_filter
+from models import OperationSketch, Sale
+
+router = APIRouter()
+
+
+def hour_filter(column, hour_from, hour_to):
+    # hour_from > hour_to é uma faixa que vira a meia-noite, ex.: 22h às 2h
+    hour_from = 0 if hour_from is None else hour_from
+    hour_to = 23 if hour_to is None else hour_to
+    if hour_from <= hour_to:
+        return and_(column >= hour_from, column <= hour_to)
+    return or_(column >= hour_from, column <= hour_to)
+
+
+def sketch_query(metric, group_by, quantiles, period, channel_id, weekday, hour_from, hour_to):
+    count = OperationSketch.delivery_count if metric == "delivery" else OperationSketch.production_count
+    groups = {
+        "day": OperationSketch.day,
+        "weekday": func.extract("dow", OperationSketch.day).cast(Integer),
+        "hour": OperationSketch.hour,
+        "channel": OperationSketch.channel_id,
+    }
+    group = [groups[group_by].label(group_by)] if group_by else []
+
+    # 1. soma os sketches do recorte, bucket a bucket
+    merged = select(*group, OperationSketch.bucket, func.sum(count).label("n"))
+    if period:
+        merged = period.apply(merged, OperationSketch.day)
+    if channel_id:
+        merged = merged.filter(OperationSketch.channel_id.in_(channel_id))
+    if weekday:
+        merged = merged.filter(func.extract("dow", OperationSketch.day).in_(weekday))
+    if hour_from is not None or hour_to is not None:
+        merged = merged.filter(hour_filter(OperationSketch.hour, hour_from, hour_to))
+    merged = merged.group_by(*group, OperationSketch.bucket).having(func.sum(count) > 0).subquery()
+
+    # 2. contagem acumulada pelos buckets, do menor tempo para o maior
+    partition = [merged.c[group_by]] if group_by else None
+    cumulative = select(
+        *([merged.c[group_by]] if group_by else []),
+        merged.c.bucket,
+        func.sum(merged.c.n).over(partition_by=partition, order_by=merged.c.bucket).label("running"),
+        func.sum(merged.c.n).over(partition_by=partition).label("total"),
+    ).subquery()
+
+    # 3. o percentil q é o primeiro bucket em que a contagem acumulada chega a q do total
+    query = select(
+        *([cumulative.c[group_by]] if group_by else []),
+        func.max(cumulative.c.total).cast(Integer).label("count"),
+        *[
+            func.round(
+                func.sketch_value(func.min(cumulative.c.bucket).filter(cumulative.c.running >= q * cumulative.c.total))
+            ).cast(Integer).label(label)
+            for q, label in quantiles
+        ],
+    )
+    if group_by:
+        query = query.group_by(cumulative.c[group_by]).order_by(cumulative.c[group_by])
+    return query
+
+
+def exact_query(metric, group_by, quantiles, period, store_id, channel_id, weekday, hour_from, hour_to):
+    seconds = Sale.delivery_seconds if metric == "delivery" else Sale.production_seconds
+    groups = {
+        "day": func.date(Sale.created_at),
+        "weekday": func.extract("dow", Sale.created_at).cast(Integer),
+        "hour": func.extract("hour", Sale.created_at).cast(Integer),
+        "channel": Sale.channel_id,
+        "store": Sale.store_id,
+    }
+    group = [groups[group_by].label(group_by)] if group_by else []
+
+    query = select(
+        *group,
+        func.count().label("count"),
+        *[func.percentile_disc(q).within_group(seconds).label(label) for q, label in quantiles],
+    ).filter(seconds > 0)
+    if period:
+        query = period.apply(query, Sale.created_at)
+    if store_id:
+        query = query.filter(Sale.store_id.in_(store_id))
+    if channel_id:
+        query = query.filter(Sale.channel_id.in_(channel_id))
+    if weekday:
+        query = query.filter(func.extract("dow", Sale.created_at).in_(weekday))
+    if hour_from is not None or hour_to is not None:
+        query = query.filter(hour_filter(func.extract("hour", Sale.created_at), hour_from, hour_to))
+    if group_by:
+        query = query.group_by(*group).order_by(*group)
+    return query
+
+
+@router.get("/percentiles")
+async def get_percentiles(
+    response: Response,
+    db: AsyncSession = Depends(get_analytics_db),
+    period: Optional[DateRange] = Depends(period_filter),
+    metric: Literal["delivery", "production"] = Query("delivery", description="Tempo de entrega ou de produção"),
+    group_by: Optional[Literal["day", "weekday", "hour", "channel", "store"]] = Query(None, description="Como agrupar; vazio = recorte inteiro"),
+    quantiles: List[float] = Query([0.5, 0.9, 0.99], description="Percentis desejados, entre 0 e 1"),
+    store_id: Optional[List[int]] = Query(None, description="Uma ou mais lojas"),
+    channel_id: Optional[List[int]] = Query(None, description="Um ou mais canais"),
+    weekday: Optional[List[int]] = Query(None, description="Domingo = 0 até sábado = 6"),
+    hour_from: Optional[int] = Query(None, ge=0, le=23),
+    hour_to: Optional[int] = Query(None, ge=0, le=23),
+):
+    if not all(0 < q < 1 for q in quantiles):
+        raise HTTPException(status_code=422, detail="Os percentis devem estar entre 0 e 1")
+    # 0.5 -> p50, 0.99 -> p99, 0.999 -> p99.9
+    quantiles = [(q, f"p{q * 100:g}") for q in dict.fromkeys(quantiles)]
+
+    if store_id or group_by == "store":
+        query = exact_query(metric, group_by, quantiles, period, store_id, channel_id, weekday, hour_from, hour_to)
+        response.headers["X-Data-Source"] = "sales"
+    else:
+        query = sketch_query(metric, group_by, quantiles, period, channel_id, weekday, hour_from, hour_to)
+        response.headers["X-Data-Source"] = "sketch"
+
+    results = await db.execute(query)
+    return [dict(row) for row in results.mappings() if row["count"]]
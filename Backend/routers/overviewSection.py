@@ -1,56 +1,64 @@
 # Abaixo temos o router do endpoint que será utilizado para obter as atividades recentes
 # tanto de novos clientes quanto de vendas realizadas. Retornamos uma lista de dicionários
-# combinada e ordenada por data/hora de criação.
+# ordenada por data/hora de criação, opcionalmente restrita a um período. A lista vem de uma
+# única consulta (activity.py) e é paginada: o cabeçalho X-Next-Cursor traz o cursor da
+# próxima página, que é enviado de volta no parâmetro `cursor`.
+#
+# O /stream mantém o front atualizado sem polling: é um Server-Sent Events que envia as
+# novas vendas/clientes assim que o banco as notifica (notifications.py).
 
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from database import get_db
-from models import Customer, Sale
+import asyncio
+import json
+from fastapi import APIRouter, Depends, Query, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+from activity import activity_feed, describe
+from database import get_async_db
+from filters import DateRange, period_filter
+from notifications import broadcaster
+
+KEEPALIVE_SECONDS = 15
 
 router = APIRouter()
 
 @router.get("/recent-activity")
-def recent_activity(db: Session = Depends(get_db), limit: int = 10):
-    # pegamos os ultimos clientes cadastrados
-    customers_query = db.query(
-        Customer.id,
-        Customer.customer_name.label("description"),
-        Customer.created_at
-    ).order_by(Customer.created_at.desc()).limit(limit)
-    
-    customers_activity = [
-        {
-            "type": "customer",
-            "id": c.id,
-            "desc": f"Novo cliente: {c.description}",
-            "time": c.created_at.strftime("%H:%M"),
-            "created_at": c.created_at
-        }
-        for c in customers_query.all()
-    ]
-
-    # e as ultimas vendas realizadas
-    sales_query = db.query(
-        Sale.id,
-        Sale.total_amount.label("amount"),
-        Sale.created_at
-    ).order_by(Sale.created_at.desc()).limit(limit)
-
-    sales_activity = [
-        {
-            "type": "sale",
-            "id": s.id,
-            "desc": f"Venda de R$ {s.amount:.2f} realizada",
-            "time": s.created_at.strftime("%H:%M"),
-            "created_at": s.created_at
-        }
-        for s in sales_query.all()
-    ]
-
-    # ordena os resultados combinados por data/hora de criação
-    # utilizando uma função lambda para a chave de ordenação
-    combined = customers_activity + sales_activity
-    combined_sorted = sorted(combined, key=lambda x: x["created_at"], reverse=True)
+async def recent_activity(
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
+    limit: int = Query(10, ge=0, le=1000),
+    cursor: Optional[str] = Query(None, description="Valor de X-Next-Cursor da página anterior"),
+    period: Optional[DateRange] = Depends(period_filter),
+):
+    rows, next_cursor = await activity_feed(db, limit, period, cursor)
+
+    # sem cabeçalho, não há próxima página
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
 
     # retorna as ultimas contas/vendas criadas até o limite definido
-    return combined_sorted[:limit]
+    return [describe(row) for row in rows]
+
+@router.get("/stream")
+async def activity_stream():
+    subscriber = broadcaster.subscribe()
+    _, queue = subscriber
+
+    async def events():
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    kind, count, rows = await asyncio.wait_for(queue.get(), KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    # comentário SSE: mantém a conexão viva através de proxies
+                    yield ": ping\n\n"
+                    continue
+                # `count` é o total de linhas da carga; `items` traz só as mais novas
+                data = {"type": kind, "count": count, "items": [describe(row) for row in rows]}
+                yield f"event: activity\ndata: {json.dumps(jsonable_encoder(data))}\n\n"
+        finally:
+            broadcaster.unsubscribe(subscriber)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
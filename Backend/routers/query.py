@@ -0,0 +1,78 @@
+# Abaixo temos o router do /query, que responde perguntas ad hoc sem um router novo para
+# cada uma. Exemplo, "qual produto vende mais na quinta à noite no iFood?":
+#   /query?dimensions=product&measures=revenue&measures=orders&weekday=4&hour_from=18&hour_to=23
+#         &channel=iFood&order_by=-orders&limit=10
+# As dimensões, medidas e filtros viram um único SELECT ... GROUP BY (ver analytics.py), que
+# roda no snapshot colunar (snapshot.py) quando ele é recente o bastante, ou no Postgres.
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Literal, Optional
+from analytics import compile_query, filter_params, run
+from database import get_analytics_db
+from filters import DateRange, period_filter
+from snapshot import MAX_STALENESS_SECONDS
+
+router = APIRouter()
+
+Dimension = Literal["store", "channel", "product", "category", "weekday", "hour", "day", "status"]
+Measure = Literal["revenue", "orders", "ticket", "quantity", "delivery_p50", "delivery_p90", "delivery_p95"]
+
+# colunas de saída de cada dimensão, usadas para validar o order_by
+DIMENSION_COLUMNS = {
+    "store": ("store_id", "store"),
+    "channel": ("channel_id", "channel"),
+    "product": ("product_id", "product"),
+    "category": ("category_id", "category"),
+    "weekday": ("weekday",),
+    "hour": ("hour",),
+    "day": ("day",),
+    "status": ("status",),
+}
+
+@router.get("/query")
+async def query(
+    response: Response,
+    db: AsyncSession = Depends(get_analytics_db),
+    period: Optional[DateRange] = Depends(period_filter),
+    dimensions: List[Dimension] = Query([], description="Como agrupar; vazio = total geral"),
+    measures: List[Measure] = Query(["revenue", "orders"], description="O que calcular"),
+    store_id: Optional[List[int]] = Query(None),
+    channel_id: Optional[List[int]] = Query(None),
+    channel: Optional[List[str]] = Query(None, description="Nome do canal, ex.: iFood"),
+    status: Optional[List[str]] = Query(None, description="Status da venda, ex.: COMPLETED"),
+    weekday: Optional[List[int]] = Query(None, description="Domingo = 0 até sábado = 6"),
+    hour_from: Optional[int] = Query(None, ge=0, le=23),
+    hour_to: Optional[int] = Query(None, ge=0, le=23),
+    product_id: Optional[List[int]] = Query(None),
+    category_id: Optional[List[int]] = Query(None),
+    order_by: Optional[str] = Query(None, description="Coluna de saída; prefixo '-' para decrescente"),
+    limit: int = Query(100, ge=1, le=10000),
+    max_staleness: float = Query(
+        MAX_STALENESS_SECONDS, ge=0,
+        description="Idade máxima aceita do snapshot, em segundos; 0 consulta sempre o Postgres",
+    ),
+):
+    # ordem canônica: a mesma pergunta escrita em outra ordem reaproveita o mesmo statement
+    dimensions = tuple(dict.fromkeys(dimensions))
+    measures = tuple(dict.fromkeys(measures))
+    if not measures:
+        raise HTTPException(status_code=422, detail="Informe ao menos uma medida")
+
+    filters, params = filter_params(
+        period, hour_from, hour_to,
+        store_id=store_id, channel_id=channel_id, channel=channel, status=status,
+        weekday=weekday, product_id=product_id, category_id=category_id,
+    )
+    params["limit"] = limit
+
+    # por padrão, ordena pela primeira medida, da maior para a menor
+    columns = [column for name in dimensions for column in DIMENSION_COLUMNS[name]] + list(measures)
+    order_by = order_by or f"-{measures[0]}"
+    descending = order_by.startswith("-")
+    order_column = order_by.lstrip("-")
+    if order_column not in columns:
+        raise HTTPException(status_code=422, detail=f"order_by deve ser uma das colunas: {', '.join(columns)}")
+
+    statement = compile_query(dimensions, measures, filters, order_column, descending)
+    return await run(db, statement, params, response, max_staleness)
@@ -0,0 +1,80 @@
+# Abaixo temos o router do ranking de produtos ("qual produto vende mais?"). O ranking sai do
+# rollup product_daily (rollups.sql), que os triggers mantêm com a quantidade e a receita de
+# cada produto por dia, canal e status, então a consulta não passa por product_sales.
+#
+# O rollup não tem loja nem hora (com elas ele teria o tamanho de product_sales); quando o
+# front filtra por loja ou por hora, o ranking vem das tabelas de vendas e itens, pelo mesmo
+# compilador do /query (analytics.py), com o snapshot colunar quando ele está recente.
+
+from fastapi import APIRouter, Depends, Query, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select
+from typing import List, Literal, Optional
+from analytics import compile_query, filter_params, run
+from database import get_analytics_db
+from filters import DateRange, period_filter
+from models import Category, Product, ProductDaily
+from snapshot import MAX_STALENESS_SECONDS
+
+router = APIRouter()
+
+@router.get("/topProducts")
+async def get_top_products(
+    response: Response,
+    db: AsyncSession = Depends(get_analytics_db),
+    period: Optional[DateRange] = Depends(period_filter),
+    store_id: Optional[List[int]] = Query(None, description="Uma ou mais lojas"),
+    channel_id: Optional[List[int]] = Query(None, description="Um ou mais canais"),
+    category_id: Optional[List[int]] = Query(None, description="Uma ou mais categorias"),
+    weekday: Optional[List[int]] = Query(None, description="Domingo = 0 até sábado = 6"),
+    hour_from: Optional[int] = Query(None, ge=0, le=23),
+    hour_to: Optional[int] = Query(None, ge=0, le=23),
+    status: List[str] = Query(["COMPLETED"], description="Um ou mais status de venda"),
+    rank_by: Literal["quantity", "revenue"] = Query("quantity", description="Ordena por quantidade ou receita"),
+    limit: int = Query(10, ge=1, le=100),
+    max_staleness: float = Query(MAX_STALENESS_SECONDS, ge=0, description="Idade máxima aceita do snapshot, em segundos"),
+):
+    if store_id or hour_from is not None or hour_to is not None:
+        filters, params = filter_params(
+            period, hour_from, hour_to,
+            store_id=store_id, channel_id=channel_id, category_id=category_id, status=status, weekday=weekday,
+        )
+        params["limit"] = limit
+        statement = compile_query(("product", "category"), ("quantity", "revenue"), filters, rank_by, True)
+        return await run(db, statement, params, response, max_staleness)
+
+    # soma a quantidade e a receita de cada produto no período
+    query = (
+        select(
+            Product.id.label("product_id"),
+            Product.name.label("product"),
+            Category.id.label("category_id"),
+            Category.name.label("category"),
+            func.sum(ProductDaily.quantity).label("quantity"),
+            func.sum(ProductDaily.revenue).label("revenue"),
+        )
+        .select_from(ProductDaily)
+        .join(Product, Product.id == ProductDaily.product_id)
+        .join(Category, Category.id == Product.category_id)
+    )
+
+    if period:
+        query = period.apply(query, ProductDaily.day)
+    if channel_id:
+        query = query.filter(ProductDaily.channel_id.in_(channel_id))
+    if category_id:
+        query = query.filter(Product.category_id.in_(category_id))
+    if weekday:
+        query = query.filter(func.extract("dow", ProductDaily.day).in_(weekday))
+    query = query.filter(ProductDaily.sale_status_desc.in_(status))
+
+    rank = query.selected_columns[rank_by]
+    query = (
+        query.group_by(Product.id, Product.name, Category.id, Category.name)
+        .order_by(rank.desc(), Product.id)
+        .limit(limit)
+    )
+    results = await db.execute(query)
+
+    response.headers["X-Data-Source"] = "rollup"
+    return [dict(row) for row in results.mappings()]
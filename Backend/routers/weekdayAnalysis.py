@@ -1,25 +1,48 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-from database import get_db
-import models
+# Abaixo temos o router do heatmap de vendas por dia da semana e hora. As contagens vêm do
+# cubo pré-calculado em heatmap.sql (views sales_hourly*), atualizado periodicamente pela
+# API, então a resposta não depende do tamanho da tabela sales. Além do período
+# (filters.py), é possível filtrar por loja, canal e status da venda.
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select
+from typing import List, Optional
+from database import get_async_db
+from filters import DateRange, period_filter
+from models import sales_hourly, sales_hourly_channels
 
 router = APIRouter()
 
 @router.get("/weekdayAnalysis")
-def get_weekday_analysis(db: Session = Depends(get_db)):
+async def get_weekday_analysis(
+    db: AsyncSession = Depends(get_async_db),
+    period: Optional[DateRange] = Depends(period_filter),
+    store_id: Optional[List[int]] = Query(None, description="Uma ou mais lojas"),
+    channel_id: Optional[List[int]] = Query(None, description="Um ou mais canais"),
+    status: Optional[List[str]] = Query(None, description="Um ou mais status de venda, ex.: COMPLETED"),
+):
+    # sem filtro de loja usamos o cubo já somado por loja, que é bem menor
+    cube = sales_hourly if store_id else sales_hourly_channels
+
     # agrupa as vendas por dia da semana (domingo = 0 e sábado = 6) e horas do dia
-    results = (
-        db.query(
-            func.extract('dow', models.Sale.created_at).label('weekday'), # dia da semana
-            func.extract('hour', models.Sale.created_at).label('hour'),   # hora
-            func.count(models.Sale.id).label('sales')                     # nº de vendas
-        )
-        .group_by('weekday', 'hour')
-        .order_by('weekday', 'hour')
-        .all()
+    query = select(
+        cube.c.weekday,                              # dia da semana
+        cube.c.hour,                                 # hora
+        func.sum(cube.c.sales_count).label('sales')  # nº de vendas
     )
 
+    if period:
+        query = period.apply(query, cube.c.day)
+    if store_id:
+        query = query.filter(cube.c.store_id.in_(store_id))
+    if channel_id:
+        query = query.filter(cube.c.channel_id.in_(channel_id))
+    if status:
+        query = query.filter(cube.c.sale_status_desc.in_(status))
+
+    query = query.group_by(cube.c.weekday, cube.c.hour).order_by(cube.c.weekday, cube.c.hour)
+    results = (await db.execute(query)).all()
+
     # reorganiza em um dicionário no formato que o front espera
     data = {i: [] for i in range(7)}  # domingo (0) até sábado (6)
 
@@ -0,0 +1,241 @@
+# Abaixo temos o snapshot colunar das tabelas de fatos, em um arquivo DuckDB local. GROUP BYs
+# grandes sobre vendas e itens levam segundos no Postgres (que lê linhas inteiras); no DuckDB,
+# que lê só as colunas usadas e agrega em lotes, as mesmas consultas levam milissegundos.
+#
+# Uma thread da API mantém o snapshot atualizado a cada SNAPSHOT_REFRESH_SECONDS (padrão 60;
+# 0 desliga): as tabelas de fatos recebem as linhas com id acima do último copiado e, de novo,
+# as alteradas ou apagadas desde a última rodada (o log snapshot_changes, mantido por triggers
+# do snapshot.sql), e as dimensões (pequenas) são copiadas inteiras. Tudo sai de uma única
+# transação REPEATABLE READ no Postgres, então vendas e itens do snapshot sempre batem entre si.
+#
+# Quem consulta informa a idade máxima aceita (padrão SNAPSHOT_MAX_STALENESS_SECONDS, 300);
+# se o snapshot for mais velho que isso, ou ainda não existir, a consulta vai para o Postgres.
+
+import os
+import tempfile
+import threading
+import time
+import duckdb
+import psycopg2
+from sqlalchemy.dialects import postgresql
+from database import URL_DATABASE
+
+SNAPSHOT_PATH = os.environ.get("SNAPSHOT_PATH", os.path.join(os.path.dirname(__file__), "snapshot.duckdb"))
+REFRESH_SECONDS = float(os.environ.get("SNAPSHOT_REFRESH_SECONDS", "60"))
+MAX_STALENESS_SECONDS = float(os.environ.get("SNAPSHOT_MAX_STALENESS_SECONDS", "300"))
+
+# tabela -> (colunas copiadas com o tipo no DuckDB, se é incremental por id)
+# só as colunas que as consultas analíticas usam; o resto fica no Postgres
+TABLES = {
+    "stores": ({"id": "INTEGER", "name": "VARCHAR"}, False),
+    "channels": ({"id": "INTEGER", "name": "VARCHAR"}, False),
+    "categories": ({"id": "INTEGER", "name": "VARCHAR"}, False),
+    "products": ({"id": "INTEGER", "category_id": "INTEGER", "name": "VARCHAR"}, False),
+    "sales": ({
+        "id": "INTEGER", "store_id": "INTEGER", "channel_id": "INTEGER", "customer_id": "INTEGER",
+        "created_at": "TIMESTAMP", "sale_status_desc": "VARCHAR", "total_amount": "DECIMAL(10,2)",
+        "production_seconds": "INTEGER", "delivery_seconds": "INTEGER",
+    }, True),
+    "product_sales": ({
+        "id": "INTEGER", "sale_id": "INTEGER", "product_id": "INTEGER",
+        "quantity": "DOUBLE", "total_price": "DOUBLE",
+    }, True),
+}
+
+# tamanho das faixas de ids comparadas quando as contagens não batem
+BUCKET_SIZE = 65536
+
+# o SQL do DuckDB é compatível com o do Postgres; só os parâmetros mudam para $1, $2, ...
+DIALECT = postgresql.dialect(paramstyle="numeric_dollar")
+
+
+class ColumnarSnapshot:
+    def __init__(self, path=SNAPSHOT_PATH):
+        self.path = path
+        self.conn = None
+        self.as_of = None  # instante (epoch) do Postgres em que os dados foram copiados
+        self.lock = threading.Lock()  # um refresh por vez
+        self.refreshes = self.repairs = self.changed_rows = 0
+        self.last_refresh_seconds = None
+        self.queries = self.fallbacks = 0
+
+    def open(self):
+        # o arquivo só pode ser aberto por um processo: com vários workers, os demais
+        # ficam sem snapshot e consultam o Postgres
+        try:
+            self.conn = duckdb.connect(self.path)
+        except duckdb.Error as error:
+            print(f"snapshot indisponível ({self.path}): {error}", flush=True)
+            return False
+        for table, (columns, _) in TABLES.items():
+            definition = ", ".join(f"{name} {type}" for name, type in columns.items())
+            self.conn.execute(f"CREATE TABLE IF NOT EXISTS {table} ({definition})")
+        # nenhuma consulta lê os complementos; arquivos antigos ainda têm a tabela
+        self.conn.execute("DROP TABLE IF EXISTS item_product_sales")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS snapshot_meta (as_of DOUBLE)")
+        row = self.conn.execute("SELECT max(as_of) FROM snapshot_meta").fetchone()
+        self.as_of = row[0]
+        return True
+
+    def age(self):
+        return None if self.as_of is None else max(0.0, time.time() - self.as_of)
+
+    def fresh(self, max_staleness=MAX_STALENESS_SECONDS):
+        age = self.age()
+        return self.conn is not None and age is not None and age <= max_staleness
+
+    def copy(self, pg, table, columns, where=""):
+        # COPY do Postgres para um CSV temporário e dele para o DuckDB: os dois lados leem
+        # e escrevem em bloco, sem passar linha a linha pelo Python
+        with tempfile.NamedTemporaryFile(suffix=".csv", dir=os.path.dirname(self.path) or ".") as file:
+            with pg.cursor() as cursor:
+                cursor.copy_expert(f"COPY (SELECT {', '.join(columns)} FROM {table}{where}) TO STDOUT WITH CSV", file)
+            file.flush()
+            if file.tell() == 0:
+                return 0
+            types = ", ".join(f"'{name}': '{type}'" for name, type in columns.items())
+            return self.conn.execute(
+                f"INSERT INTO {table} SELECT * FROM read_csv(?, header = false, columns = {{{types}}})",
+                [file.name],
+            ).fetchone()[0]
+
+    def bucket_counts(self, pg, table, last_id):
+        # contagem por faixa de ids nos dois lados, para achar onde eles divergem
+        query = f"SELECT id / {BUCKET_SIZE}, count(*) FROM {table} WHERE id <= {last_id} GROUP BY 1"
+        with pg.cursor() as cursor:
+            cursor.execute(query)
+            source = dict(cursor.fetchall())
+        return source, dict(self.conn.execute(query.replace("/", "//")).fetchall())
+
+    def changes(self, pg, table):
+        # entradas do log de alterações visíveis nesta transação: (seqs, ids alterados)
+        with pg.cursor() as cursor:
+            cursor.execute("SELECT seq, row_id FROM snapshot_changes WHERE table_name = %s", (table,))
+            rows = cursor.fetchall()
+        return [seq for seq, _ in rows], sorted({row_id for _, row_id in rows})
+
+    def sync(self, pg, table, columns, changed):
+        copied = 0
+        last_id = self.conn.execute(f"SELECT coalesce(max(id), 0) FROM {table}").fetchone()[0]
+        # linhas alteradas ou apagadas: as já copiadas saem e voltam com o valor atual (as de id
+        # acima do último copiado vêm com as novas linhas)
+        changed = [row_id for row_id in changed if row_id <= last_id]
+        if changed:
+            self.conn.execute(f"DELETE FROM {table} WHERE id IN (SELECT unnest(?))", [changed])
+            copied += self.copy(pg, table, columns, f" WHERE id = ANY('{{{','.join(map(str, changed))}}}'::int[])")
+            self.changed_rows += len(changed)
+
+        # novas linhas: só as de id acima do último copiado
+        count = self.conn.execute(f"SELECT count(*) FROM {table}").fetchone()[0]
+        with pg.cursor() as cursor:
+            cursor.execute(f"SELECT count(*) FROM {table} WHERE id <= %s", (last_id,))
+            matches = cursor.fetchone()[0] == count
+        if not matches:
+            # um TRUNCATE, ou transações com ids menores que só fizeram commit depois
+            # da última cópia: copia de novo só as faixas de ids em que as contagens diferem
+            source, copied_counts = self.bucket_counts(pg, table, last_id)
+            buckets = sorted(
+                bucket for bucket in source.keys() | copied_counts.keys()
+                if source.get(bucket) != copied_counts.get(bucket)
+            )
+            self.conn.execute(f"DELETE FROM {table} WHERE id // {BUCKET_SIZE} IN ({', '.join(map(str, buckets))})")
+            where = f" WHERE id <= {last_id} AND id / {BUCKET_SIZE} IN ({', '.join(map(str, buckets))})"
+            copied += self.copy(pg, table, columns, where)
+            self.repairs += len(buckets)
+        return copied + self.copy(pg, table, columns, f" WHERE id > {last_id}")
+
+    def refresh(self):
+        """Traz as novas linhas do Postgres; devolve quantas linhas foram copiadas"""
+        with self.lock:
+            started = time.perf_counter()
+            copied = 0
+            consumed = []
+            pg = psycopg2.connect(URL_DATABASE)
+            try:
+                pg.set_session(isolation_level="REPEATABLE READ", readonly=True)
+                with pg.cursor() as cursor:
+                    cursor.execute("SELECT extract(epoch FROM transaction_timestamp())::float8")
+                    as_of = cursor.fetchone()[0]
+                self.conn.begin()
+                try:
+                    for table, (columns, incremental) in TABLES.items():
+                        if incremental:
+                            seqs, changed = self.changes(pg, table)
+                            copied += self.sync(pg, table, columns, changed)
+                            consumed += seqs
+                        else:
+                            self.conn.execute(f"DELETE FROM {table}")
+                            copied += self.copy(pg, table, columns)
+                    self.conn.execute("DELETE FROM snapshot_meta")
+                    self.conn.execute("INSERT INTO snapshot_meta VALUES (?)", [as_of])
+                    self.conn.commit()
+                except BaseException:
+                    self.conn.rollback()
+                    raise
+                # só depois do commit no DuckDB as entradas aplicadas saem do log; se algo falhar
+                # antes disso, a próxima rodada as aplica de novo (apagar e copiar é idempotente)
+                if consumed:
+                    pg.rollback()
+                    pg.set_session(isolation_level="READ COMMITTED", readonly=False)
+                    with pg.cursor() as cursor:
+                        cursor.execute("DELETE FROM snapshot_changes WHERE seq = ANY(%s)", (consumed,))
+                    pg.commit()
+            finally:
+                pg.close()
+            # as consultas em andamento continuam vendo a versão anterior até o commit
+            self.as_of = as_of
+            self.refreshes += 1
+            self.last_refresh_seconds = time.perf_counter() - started
+            return copied
+
+    def execute(self, statement, params):
+        """Executa um select do SQLAlchemy no snapshot; devolve uma lista de dicts"""
+        compiled = statement.params(params).compile(dialect=DIALECT, compile_kwargs={"render_postcompile": True})
+        values = [compiled.params[name] for name in compiled.positiontup]
+        # cada thread usa o seu próprio cursor sobre o mesmo banco
+        with self.conn.cursor() as cursor:
+            cursor.execute(compiled.string, values)
+            names = [column[0] for column in cursor.description]
+            rows = [dict(zip(names, row)) for row in cursor.fetchall()]
+        self.queries += 1
+        return rows
+
+    def stats(self):
+        age = self.age()
+        return {
+            "available": self.conn is not None,
+            "age_seconds": None if age is None else round(age, 1),
+            "max_staleness_seconds": MAX_STALENESS_SECONDS,
+            "refreshes": self.refreshes,
+            "repaired_buckets": self.repairs,
+            "changed_rows": self.changed_rows,
+            "last_refresh_seconds": None if self.last_refresh_seconds is None else round(self.last_refresh_seconds, 2),
+            "queries": self.queries,
+            "fallbacks": self.fallbacks,
+        }
+
+
+snapshot = ColumnarSnapshot()
+
+
+class SnapshotRefresher(threading.Thread):
+    def __init__(self, interval=REFRESH_SECONDS):
+        super().__init__(name="snapshot-refresh", daemon=True)
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        if not snapshot.open():
+            return
+        while not self.stopped.is_set():
+            started = time.perf_counter()
+            try:
+                copied = snapshot.refresh()
+                print(f"snapshot atualizado em {time.perf_counter() - started:.2f}s ({copied} linhas)", flush=True)
+            except Exception as error:
+                # como no heatmap: uma falha não derruba a thread, tentamos na próxima rodada
+                print(f"falha ao atualizar o snapshot: {error}", flush=True)
+            self.stopped.wait(self.interval)
+
+    def stop(self):
+        self.stopped.set()
@@ -0,0 +1,50 @@
+-- Change log for the columnar snapshot (snapshot.py). The snapshot copies new
+-- rows by id, which misses rows changed in place: a sale going from COMPLETED
+-- to CANCELLED keeps its id and every count. After every statement that
+-- updates or deletes sales or product_sales, the ids it touched are logged
+-- here; each refresh copies those rows again and deletes the entries it
+-- applied, so an entry committed after a refresh started waits for the next.
+--
+-- Inserts are not logged (the snapshot copies ids above the last copied one)
+-- and neither is TRUNCATE (the snapshot sees the counts drop). Only updates
+-- and deletes accumulate while the snapshot is off; the next refresh applies
+-- and clears them.
+-- Safe to run again: the API applies this file at startup.
+
+SELECT pg_advisory_xact_lock(hashtext('snapshot.sql'));
+
+CREATE TABLE IF NOT EXISTS snapshot_changes (
+    seq BIGSERIAL PRIMARY KEY,
+    table_name TEXT NOT NULL,
+    row_id INTEGER NOT NULL
+);
+
+-- an update can change the id itself, so both the old and the new id are logged
+CREATE OR REPLACE FUNCTION snapshot_log_update() RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO snapshot_changes (table_name, row_id)
+    SELECT TG_TABLE_NAME, id FROM old_rows
+    UNION
+    SELECT TG_TABLE_NAME, id FROM new_rows;
+    RETURN NULL;
+END $$;
+
+CREATE OR REPLACE FUNCTION snapshot_log_delete() RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO snapshot_changes (table_name, row_id)
+    SELECT TG_TABLE_NAME, id FROM old_rows;
+    RETURN NULL;
+END $$;
+
+CREATE OR REPLACE TRIGGER snapshot_sales_update AFTER UPDATE ON sales
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION snapshot_log_update();
+CREATE OR REPLACE TRIGGER snapshot_sales_delete AFTER DELETE ON sales
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION snapshot_log_delete();
+CREATE OR REPLACE TRIGGER snapshot_product_sales_update AFTER UPDATE ON product_sales
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION snapshot_log_update();
+CREATE OR REPLACE TRIGGER snapshot_product_sales_delete AFTER DELETE ON product_sales
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION snapshot_log_delete();
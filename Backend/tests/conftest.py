@@ -0,0 +1,5 @@
+# os módulos do backend ficam na raiz de Backend/ (layout plano, como o uvicorn os importa)
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,75 @@
+import base64
+from collections import namedtuple
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.dialects import postgresql
+
+from activity import after_cursor, decode_cursor, describe, encode_cursor
+from models import Customer, Sale
+
+Row = namedtuple("Row", "type id name amount created_at")
+
+NOON = datetime(2026, 5, 1, 12, 0, 0, 123456)
+
+
+def sql(clause):
+    return str(clause.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+
+
+def raw_cursor(text):
+    return base64.urlsafe_b64encode(text.encode()).decode().rstrip("=")
+
+
+@pytest.mark.parametrize("row", [
+    Row("sale", 1, None, Decimal("10.00"), NOON),
+    Row("customer", 123456789, "Ana", None, datetime(2025, 1, 1)),
+])
+def test_cursor_roundtrip(row):
+    cursor = encode_cursor(row)
+    # vai na URL e no header X-Next-Cursor: sem padding nem caracteres reservados
+    assert "=" not in cursor and "+" not in cursor and "/" not in cursor
+    assert decode_cursor(cursor) == (row.created_at, row.type, row.id)
+
+
+@pytest.mark.parametrize("cursor", [
+    "%%%",
+    raw_cursor("2026-05-01T12:00:00|sale"),
+    raw_cursor("2026-05-01T12:00:00|store|1"),
+    raw_cursor("2026-05-01T12:00:00|sale|x"),
+    raw_cursor("ontem|sale|1"),
+    raw_cursor("2026-05-01T12:00:00|sale|1") + "Ã",
+])
+def test_invalid_cursor_is_rejected(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor)
+    assert error.value.status_code == 422
+
+
+def test_same_kind_breaks_ties_by_id():
+    # mesmo instante e mesmo tipo: só os ids menores ficam para a próxima página
+    assert sql(after_cursor(Sale, "sale", (NOON, "sale", 5))) == (
+        "sales.created_at <= '2026-05-01 12:00:00.123456' "
+        "AND (sales.created_at < '2026-05-01 12:00:00.123456' OR sales.id < 5)"
+    )
+
+
+def test_sales_at_the_cursor_instant_precede_customers():
+    # ordem (created_at, tipo, id) decrescente: em um empate, 'sale' vem antes de 'customer'
+    # depois de um cliente, as vendas do mesmo instante já foram entregues
+    assert sql(after_cursor(Sale, "sale", (NOON, "customer", 5))) == (
+        "sales.created_at < '2026-05-01 12:00:00.123456'"
+    )
+    # depois de uma venda, todos os clientes do mesmo instante ainda faltam
+    assert sql(after_cursor(Customer, "customer", (NOON, "sale", 5))) == (
+        "customers.created_at <= '2026-05-01 12:00:00.123456'"
+    )
+
+
+def test_describe():
+    assert describe(Row("sale", 7, None, Decimal("42.5"), NOON))["desc"] == "Venda de R$ 42.50 realizada"
+    customer = describe(Row("customer", 3, "Ana", None, NOON))
+    assert customer["desc"] == "Novo cliente: Ana"
+    assert customer["time"] == "12:00"
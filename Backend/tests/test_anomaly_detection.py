@@ -0,0 +1,79 @@
+import copy
+
+import pytest
+
+from anomaly_detection import THRESHOLD, WARMUP, Series
+
+# um dia por posição, segunda a domingo: o fim de semana vende mais
+WEEKDAYS = [100, 90, 95, 110, 140, 180, 160]
+# ruído relativo fixo (±7%); 11 valores, para não se alinhar com as semanas
+NOISE = [0.04, -0.03, 0.06, -0.05, 0.01, -0.07, 0.03, -0.02, 0.05, -0.04, 0.0]
+
+
+def history(weeks):
+    series = Series()
+    flags = [series.observe(day % 7, WEEKDAYS[day % 7] * (1 + NOISE[day % 11])) for day in range(weeks * 7)]
+    return series, flags
+
+
+@pytest.fixture(scope="module")
+def stable():
+    series, flags = history(8)
+    assert not any(flags)
+    return series
+
+
+def test_nothing_is_flagged_during_warmup():
+    series, _ = history(WARMUP - 1)
+    # cada dia da semana tem menos de WARMUP semanas: nem um valor triplicado é sinalizado
+    assert all(series.observe(weekday, WEEKDAYS[weekday] * 3) is None for weekday in range(7))
+
+
+def test_one_weekday_alone_is_not_enough_history():
+    # WARMUP semanas de segundas, mas poucos resíduos para estimar a dispersão
+    series = Series()
+    for week in range(WARMUP + 2):
+        assert series.observe(0, 100 * (1 + NOISE[week])) is None
+    assert series.observe(0, 300) is None
+
+
+def test_spike(stable):
+    series = copy.deepcopy(stable)
+    mean = series.weekday_mean[5]
+    kind, expected, score = series.observe(5, mean * 1.3)
+    assert kind == "spike"
+    assert expected == mean
+    assert score >= THRESHOLD
+
+
+def test_drop(stable):
+    series = copy.deepcopy(stable)
+    kind, expected, score = series.observe(0, series.weekday_mean[0] * 0.7)
+    assert kind == "drop"
+    assert score <= -THRESHOLD
+
+
+def test_ordinary_day_is_not_flagged(stable):
+    assert copy.deepcopy(stable).observe(0, stable.weekday_mean[0] * 1.1) is None
+
+
+def test_spike_does_not_move_the_reference(stable):
+    series = copy.deepcopy(stable)
+    deviation = series.deviation
+    assert series.observe(0, stable.weekday_mean[0] * 3)[0] == "spike"
+    # o dia sinalizado fica fora da dispersão e entra limitado na linha de base e no nível
+    assert series.deviation == deviation
+    assert series.weekday_mean[0] < stable.weekday_mean[0] * 1.2
+    assert series.observe(1, WEEKDAYS[1]) is None
+
+
+@pytest.mark.parametrize("factor", [1.12, 0.88])
+def test_shift(stable, factor):
+    # dias seguidos acima (ou abaixo) do normal, nenhum extremo sozinho: muda o nível
+    series = copy.deepcopy(stable)
+    flags = [series.observe(weekday, WEEKDAYS[weekday] * factor) for weekday in range(7)]
+    assert flags[0] is None
+    kinds = {flag[0] for flag in flags if flag}
+    assert kinds == {"shift"}
+    score = next(flag[2] for flag in flags if flag)
+    assert (score > 0) == (factor > 1)
@@ -0,0 +1,102 @@
+from datetime import date, datetime
+from decimal import Decimal
+
+import pytest
+from fastapi import HTTPException
+
+from filters import DateRange
+from routers.comparison import a_year_before, change, compare, windows
+
+
+def row(channel_id, revenue_current, orders_current, revenue_baseline, orders_baseline):
+    # como sai da consulta: somas DECIMAL e contagens inteiras por canal
+    return {
+        "channel_id": channel_id,
+        "revenue_current": Decimal(revenue_current), "orders_current": orders_current,
+        "revenue_baseline": Decimal(revenue_baseline), "orders_baseline": orders_baseline,
+    }
+
+
+def totals(rows):
+    # mesmo total que o router calcula a partir das linhas
+    sums = {key: sum(r[key] for r in rows) for key in rows[0] if key != "channel_id"}
+    return {
+        "revenue": change(sums["revenue_current"], sums["revenue_baseline"]),
+        "orders": change(sums["orders_current"], sums["orders_baseline"]),
+        "ticket": change(
+            sums["revenue_current"] / sums["orders_current"],
+            sums["revenue_baseline"] / sums["orders_baseline"],
+        ),
+    }
+
+
+ROWS = [
+    row(1, "5200.00", 100, "4000.00", 80),  # ticket sobe de 50 para 52
+    row(2, "1800.00", 60, "3500.00", 100),  # ticket cai de 35 para 30 e perde peso
+    row(3, "900.00", 20, "0", 0),           # canal novo: só existe na janela atual
+    row(4, "0", 0, "1200.00", 40),          # canal encerrado: só existe na janela anterior
+]
+
+
+def test_contributions_add_up_to_the_ticket_change():
+    total = totals(ROWS)
+    breakdown = compare(ROWS, total)
+    contributions = [item["ticket"]["contribution"] for item in breakdown]
+    # cada contribuição é arredondada a centavos
+    assert sum(contributions) == pytest.approx(total["ticket"]["delta"], abs=0.01 * len(ROWS))
+
+
+def test_rate_and_mix_split_each_contribution():
+    for item in compare(ROWS, totals(ROWS)):
+        ticket = item["ticket"]
+        assert ticket["rate_effect"] + ticket["mix_effect"] == pytest.approx(ticket["contribution"], abs=0.011)
+
+
+def test_rate_effect_is_the_ticket_change_at_the_current_weight():
+    channel = compare(ROWS, totals(ROWS))[0]
+    # peso atual 100/180, ticket de 50 para 52
+    assert channel["ticket"]["rate_effect"] == pytest.approx(round(100 / 180 * 2, 2))
+    assert channel["ticket"]["delta_pct"] == 4.0
+
+
+def test_rows_in_only_one_window_are_pure_mix():
+    total = totals(ROWS)
+    new, closed = compare(ROWS, total)[2:]
+    for item in (new, closed):
+        assert item["ticket"]["rate_effect"] == 0
+        assert item["ticket"]["mix_effect"] == item["ticket"]["contribution"]
+        assert item["ticket"]["delta_pct"] is None
+    assert new["ticket"]["contribution"] == pytest.approx(round(20 / 180 * 45, 2))
+    assert closed["ticket"]["contribution"] == pytest.approx(round(-40 / 220 * 30, 2))
+    assert new["revenue"]["delta_pct"] is None
+    assert closed["orders"]["delta_pct"] == -100.0
+
+
+def test_shares_of_change_add_up_to_100():
+    breakdown = compare(ROWS, totals(ROWS))
+    for metric in ("revenue", "orders"):
+        assert sum(item[metric]["share_of_change_pct"] for item in breakdown) == pytest.approx(100, abs=0.05)
+    assert [item["channel_id"] for item in breakdown] == [1, 2, 3, 4]
+
+
+def test_a_year_before():
+    assert a_year_before(date(2025, 3, 15)) == date(2024, 3, 15)
+    assert a_year_before(date(2024, 2, 29)) == date(2023, 2, 28)
+    assert a_year_before(date(2024, 3, 1)) == date(2023, 3, 1)
+
+
+def test_windows():
+    february = DateRange(datetime(2024, 2, 1), datetime(2024, 3, 1))
+    assert windows(february, "previous") == (
+        (date(2024, 2, 1), date(2024, 3, 1)), (date(2024, 1, 3), date(2024, 2, 1)))
+    assert windows(february, "last_year") == (
+        (date(2024, 2, 1), date(2024, 3, 1)), (date(2023, 2, 1), date(2023, 3, 1)))
+    leap_day = DateRange(datetime(2024, 2, 29), datetime(2024, 3, 1))
+    assert windows(leap_day, "last_year")[1] == (date(2023, 2, 28), date(2023, 3, 1))
+
+
+@pytest.mark.parametrize("period", [None, DateRange(datetime(2024, 2, 1), None), DateRange(None, datetime(2024, 3, 1))])
+def test_windows_need_both_ends(period):
+    with pytest.raises(HTTPException) as error:
+        windows(period, "previous")
+    assert error.value.status_code == 422
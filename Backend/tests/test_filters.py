@@ -0,0 +1,80 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+
+from filters import DateRange, period_filter
+
+
+def period(**params):
+    # chamada direta: os defaults da dependência são objetos Query, não None
+    kinds = dict(month=None, week=None, year=None, start_date=None, end_date=None, last_days=None)
+    return period_filter(**{**kinds, **params})
+
+
+def rejects(**params):
+    with pytest.raises(HTTPException) as error:
+        period(**params)
+    return error.value.status_code
+
+
+def test_no_period_means_no_filter():
+    assert period() is None
+
+
+@pytest.mark.parametrize("params", [
+    dict(month=3, week=10),
+    dict(month=3, start_date=date(2025, 1, 1)),
+    dict(week=10, end_date=date(2025, 1, 1)),
+    dict(last_days=7, start_date=date(2025, 1, 1), end_date=date(2025, 1, 31)),
+])
+def test_conflicting_kinds_are_rejected(params):
+    assert rejects(**params) == 422
+
+
+def test_start_after_end_is_rejected():
+    assert rejects(start_date=date(2025, 2, 1), end_date=date(2025, 1, 1)) == 422
+
+
+def test_month_is_half_open():
+    assert period(month=12, year=2024) == DateRange(datetime(2024, 12, 1), datetime(2025, 1, 1))
+    assert period(month=2, year=2024) == DateRange(datetime(2024, 2, 1), datetime(2024, 3, 1))
+
+
+def test_week_is_half_open():
+    # a semana ISO 1 de 2025 começa na segunda, 30/12/2024
+    assert period(week=1, year=2025) == DateRange(datetime(2024, 12, 30), datetime(2025, 1, 6))
+
+
+def test_missing_iso_week_is_rejected():
+    assert rejects(week=53, year=2025) == 422
+
+
+def test_year_is_half_open():
+    assert period(year=2025) == DateRange(datetime(2025, 1, 1), datetime(2026, 1, 1))
+
+
+def test_date_range_includes_the_whole_end_day():
+    assert period(start_date=date(2025, 1, 1), end_date=date(2025, 1, 31)) == DateRange(
+        datetime(2025, 1, 1), datetime(2025, 2, 1))
+    assert period(end_date=date(2025, 1, 31)) == DateRange(None, datetime(2025, 2, 1))
+    assert period(start_date=date(2025, 1, 1)) == DateRange(datetime(2025, 1, 1), None)
+
+
+def test_last_days_counts_today():
+    tomorrow = datetime.combine(date.today() + timedelta(days=1), datetime.min.time())
+    assert period(last_days=1) == DateRange(tomorrow - timedelta(days=1), tomorrow)
+    assert period(last_days=7) == DateRange(tomorrow - timedelta(days=7), tomorrow)
+
+
+@pytest.mark.parametrize("params", [
+    dict(end_date=date.max),
+    dict(start_date=date(9999, 12, 1), end_date=date.max),
+    dict(month=12, year=9999),
+    dict(week=52, year=9999),
+    dict(year=9999),
+    dict(last_days=10 ** 9),
+])
+def test_periods_past_the_date_limits_are_rejected(params):
+    # o dia seguinte a date.max não existe: 422 em vez de OverflowError (500)
+    assert rejects(**params) == 422
@@ -0,0 +1,82 @@
+import csv
+import glob
+import gzip
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+from generate_data import (
+    FakerPools, IdRange, ShardSink, day_id_ranges, derive_seed, generate_customers, generate_day,
+    generate_products_and_items, generate_stores, planned_sales, seed_generators, setup_base_data,
+)
+
+PROMO_DAY = datetime(2026, 5, 2)  # a Saturday, the busiest weekday
+
+
+def export_context(sink, scale, engine='numpy'):
+    seed_generators(derive_seed(1, 'dimensions'))
+    sub_brand_ids, channels, payment_type_ids = setup_base_data(sink)
+    stores = generate_stores(sink, sub_brand_ids, 5)
+    products, items, option_groups = generate_products_and_items(sink, sub_brand_ids, 50, 20)
+    customers = generate_customers(sink, 100)
+    context = {
+        'stores': stores, 'channels': channels, 'products': products,
+        'items': items, 'option_groups': option_groups, 'customers': customers,
+        'dimensions': {'payment_types': payment_type_ids}, 'start_date': PROMO_DAY - timedelta(days=180),
+        'loader': 'copy', 'engine': engine, 'seed': 1, 'pools': FakerPools(100, 1), 'scale': scale,
+        'anomaly_week': PROMO_DAY - timedelta(days=90), 'promo_day': PROMO_DAY, 'run_id': None,
+    }
+    context['id_ranges'] = day_id_ranges(context['start_date'], PROMO_DAY, context)
+    return context
+
+
+def shard_ids(directory, table, column='id'):
+    ids = []
+    for path in glob.glob(os.path.join(directory, table, '*.csv.gz')):
+        with gzip.open(path, 'rt', encoding='utf-8') as shard:
+            ids.extend(int(row[column]) for row in csv.DictReader(shard))
+    return ids
+
+
+def test_id_ranges_follow_each_other():
+    ranges = [({'sales': 1}, {'sales': 10}), ({'sales': 11}, {'sales': 5})]
+    first, second = (IdRange(*id_range) for id_range in ranges)
+    assert first.take('sales', 10) == list(range(1, 11))
+    assert second.take('sales', 5) == list(range(11, 16))
+
+
+def test_id_range_rejects_overflow():
+    ids = IdRange({'sales': 1}, {'sales': 3})
+    ids.take('sales', 3)
+    with pytest.raises(ValueError):
+        ids.take('sales', 1)
+
+
+def test_export_promo_day_at_high_scale(tmp_path):
+    # at --scale 40 the promo day has ~600k sales and more than 2^20 product lines
+    sink = ShardSink(str(tmp_path))
+    context = export_context(sink, scale=40)
+    starts, sizes = context['id_ranges'][-1]
+
+    sales, _ = generate_day(sink, PROMO_DAY, context)
+
+    assert sales == planned_sales(PROMO_DAY, context) == sizes['sales']
+    sale_ids = shard_ids(tmp_path, 'sales')
+    assert sorted(sale_ids) == list(range(starts['sales'], starts['sales'] + sales))
+    product_sale_ids = shard_ids(tmp_path, 'product_sales')
+    assert len(product_sale_ids) > 1 << 20
+    assert len(set(product_sale_ids)) == len(product_sale_ids)
+    assert starts['product_sales'] <= min(product_sale_ids)
+    assert max(product_sale_ids) < starts['product_sales'] + sizes['product_sales']
+    # the last day of a 180-day run stays far from the int4 limit
+    assert starts['product_sales'] + sizes['product_sales'] < 2 ** 31
+
+
+def test_planned_sales_match_both_engines(tmp_path):
+    for engine in ('python', 'numpy'):
+        sink = ShardSink(str(tmp_path / engine))
+        context = export_context(sink, scale=0.05, engine=engine)
+        day = PROMO_DAY - timedelta(days=1)
+        sales, _ = generate_day(sink, day, context)
+        assert sales == planned_sales(day, context)